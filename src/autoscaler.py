@@ -1,13 +1,15 @@
 from dataclasses import dataclass, field
+import hashlib
 import logging
+import math
 from pathlib import Path
 import sys
 
 if sys.version_info >= (3, 8):
-    from typing import TypedDict, List, Tuple
+    from typing import Dict, TypedDict, List, Tuple
 else:
     from typing_extensions import TypedDict
-    from typing import List, Tuple
+    from typing import Dict, List, Tuple
 import yaml
 
 from errors import JujuEnvironmentError
@@ -15,17 +17,81 @@ from errors import JujuEnvironmentError
 logger = logging.getLogger(__name__)
 CONTROLLER = "scaler-controller"
 CLOUD_CONFIG_FILE = Path("/", "config", "cloud-config.yaml")
+ARGS_FILE = Path("/", "config", "autoscaler-args")
+SHELL = Path("/", "bin", "sh")
+HEALTH_CHECK = "juju-autoscaler-health"
+# cluster-autoscaler serves metrics and health checks on --address, :8085 by default
+DEFAULT_ADDRESS = ":8085"
+MiB = 2**20
+# Node totals are rounded up to a power of two, at least this, before sizing
+NODES_FLOOR = 16
+# Resources grow with the nodes the autoscaler may manage, from a small cluster's floor
+CPU_BASE, CPU_PER_NODE, CPU_MAX = 0.1, 0.0005, 4.0
+MEMORY_BASE, MEMORY_PER_NODE, MEMORY_MAX = 300 * MiB, 1 * MiB, 16384 * MiB
+# Room above the memory request before the kernel kills the autoscaler
+MEMORY_LIMIT_RATIO = 2
+# Leave the Go garbage collector headroom below the container's memory limit
+GOMEMLIMIT_RATIO = 0.9
+# Least GOMAXPROCS, so the scan loop and api clients don't share a single thread
+GOMAXPROCS_FLOOR = 2
+# Only the unit holding the lease scales, a standby takes over within a lease duration
+LEADER_ELECTION = {
+    "leader-elect": "true",
+    "leader-elect-resource-lock": "leases",
+    "leader-elect-lease-duration": "10s",
+    "leader-elect-renew-deadline": "7s",
+    "leader-elect-retry-period": "2s",
+}
+# Runs the autoscaler with one argument per line of ARGS_FILE
+ARGS_SCRIPT = (
+    'set --; while IFS= read -r arg; do set -- "$@" "$arg"; done < {args}; exec {binary} "$@"'
+)
 
 
 CloudConfig = TypedDict(
-    "CloudConfig", {"endpoints": List[str], "ca-cert": str, "user": str, "password": str}
+    "CloudConfig",
+    {
+        "endpoints": List[str],
+        "ca-cert": str,
+        "user": str,
+        "password": str,
+        "node-templates": Dict[str, dict],
+    },
+    total=False,
 )
 
 
+def _sizing(nodes, overrides):
+    """Container resources and Go runtime environment for managing up to nodes nodes.
+
+    No cpu limit is set so the scan loop is never throttled. GOMAXPROCS follows the
+    cpu requested rounded up, but is at least 2, so the runtime may briefly use
+    more than a small request. nodes is rounded up first, so small changes to node
+    groups don't replace the pod.
+    """
+    nodes = max(NODES_FLOOR, 2 ** math.ceil(math.log2(max(nodes, 1))))
+    cpu = overrides.cpu or min(CPU_BASE + nodes * CPU_PER_NODE, CPU_MAX)
+    memory = overrides.memory or min(MEMORY_BASE + nodes * MEMORY_PER_NODE, MEMORY_MAX)
+    limit = memory * MEMORY_LIMIT_RATIO
+    resources = {
+        "requests": {"cpu": f"{math.ceil(round(cpu * 1000, 3))}m", "memory": f"{memory // MiB}Mi"},
+        "limits": {"memory": f"{limit // MiB}Mi"},
+    }
+    environment = {
+        "GOMAXPROCS": str(max(GOMAXPROCS_FLOOR, math.ceil(cpu))),
+        "GOMEMLIMIT": f"{int(limit * GOMEMLIMIT_RATIO) // MiB}MiB",
+    }
+    return resources, environment
+
+
 @dataclass
 class AutoScaler:
     cloud_config: CloudConfig = field(default_factory=CloudConfig)
     command: str = ""
+    args: str = ""
+    address: str = DEFAULT_ADDRESS
+    resources: dict = field(default_factory=dict)
+    environment: dict = field(default_factory=dict)
 
     def _build_command(self, config, charm):
         model, scale = config["default_model_uuid"], config["scale"]
@@ -34,20 +100,50 @@ class AutoScaler:
             logger.info("Missing juju-scale config")
             raise JujuEnvironmentError("Waiting for Juju Configuration")
 
+        extra_args = config["profile"].merged(config["extra_args"].key_values)
+        defaults = {
+            **LEADER_ELECTION,
+            # the lease is scoped to the application, within the model's namespace
+            "leader-elect-resource-name": charm.model.app.name,
+        }
+        if scale.priorities(model.cfg):
+            defaults["expander"] = "priority"
+        if scale.scheduled:
+            # a scheduled min only pre-warms capacity if the autoscaler scales up to it
+            defaults["enforce-node-group-min-size"] = "true"
+        given = dict(extra_args)
+        extra_args += [(key, value) for key, value in defaults.items() if key not in given]
+        self.address = dict(extra_args).get("address", DEFAULT_ADDRESS)
+        if config["args_file"]:
+            # Keep the command constant, the arguments are pushed in ARGS_FILE
+            args = [
+                f"--namespace={charm.model.name.strip()}",
+                "--cloud-provider=juju",
+                f"--cloud-config={CLOUD_CONFIG_FILE}",
+                *(f"--nodes={node}" for node in node_groups),
+                *sorted(f"--{key}={value}" for key, value in extra_args),
+            ]
+            self.args = "\n".join(args) + "\n"
+            script = ARGS_SCRIPT.format(args=ARGS_FILE, binary=self.binary)
+            self.command = f"{SHELL} -c '{script}'"
+            return self
+
         namespace = f"--namespace {charm.model.name.strip()}"
         provider = f"--cloud-provider=juju --cloud-config={CLOUD_CONFIG_FILE}"
         nodes = " ".join([f"--nodes {node}" for node in node_groups])
 
-        extra_args = config["extra_args"].key_values
         extra = ""
         if extra_args:
             extra = " " + " ".join(sorted(f"--{key}='{value}'" for key, value in extra_args))
 
+        self.args = ""
         self.command = f"{self.binary} {namespace} {provider} {nodes}{extra}"
         return self
 
     def apply(self, config, charm):
         self._build_command(config, charm)
+        nodes = sum(group.max for group in config["scale"].scale)
+        self.resources, self.environment = _sizing(nodes, config["resources"])
 
         self.cloud_config = {
             "ca-cert": config["ca_cert"].decoded,
@@ -60,15 +156,44 @@ class AutoScaler:
         if missing:
             logger.info("Missing cloud-config : %s", ",".join(missing))
             raise JujuEnvironmentError(f"Waiting for Juju Configuration: {','.join(missing)}")
+        templates = config["scale"].templates(config["default_model_uuid"].cfg)
+        if templates:
+            self.cloud_config["node-templates"] = templates
         return self
 
-    def authorize(self, container):
-        container.add_layer(container.name, self.layer, combine=True)
-        container.push(*self.cloud_config_file, make_dirs=True, **self.root_owned)
+    def authorize(self, state):
+        """Replan and push the config files where needed, returning True if any changed.
+
+        Unchanged layers and files cost no pebble calls, as state compares them
+        with the plan already fetched and the digests of what it last pushed.
+        """
+        replanned = state.ensure_layer(state.name, self.layer)
+        if replanned:
+            logger.info("starting autoscaler with command %s", self.command)
+        args = bool(self.args) and state.ensure_file(
+            str(ARGS_FILE), self.args, make_dirs=True, **self.root_owned
+        )
+        pushed = state.ensure_file(*self.cloud_config_file, make_dirs=True, **self.root_owned)
+        return replanned or args or pushed
+
+    def fingerprint(self, *extra: str) -> str:
+        """Digest of the desired workload state.
+
+        Covers the service command, the pushed cloud-config and any extra
+        state (such as the manifest digest) supplied by the caller.
+        """
+        digest = hashlib.sha256()
+        for part in (self.command, self.args, *self.cloud_config_file, *extra):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @property
+    def executables(self):
+        return [SHELL, self.binary] if self.args else [self.binary]
 
     @property
     def layer(self):
-        logger.info("starting autoscaler with command %s", self.command)
         return {
             "summary": "juju-autoscaler layer",
             "description": "pebble config layer for juju-autoscaler",
@@ -78,10 +203,28 @@ class AutoScaler:
                     "summary": "juju-autoscaler",
                     "command": self.command,
                     "startup": "enabled",
+                    "environment": self.environment,
+                    "on-check-failure": {HEALTH_CHECK: "restart"},
+                }
+            },
+            "checks": {
+                HEALTH_CHECK: {
+                    "override": "replace",
+                    "level": "alive",
+                    "period": "10s",
+                    "timeout": "3s",
+                    "threshold": 3,
+                    "http": {"url": self.health_check_url},
                 }
             },
         }
 
+    @property
+    def health_check_url(self):
+        # pebble probes from inside the pod, whichever interface the address binds
+        port = self.address.rpartition(":")[2]
+        return f"http://localhost:{port}/health-check"
+
     @property
     def binary(self):
         return Path("/", "cluster-autoscaler")
@@ -13,18 +13,50 @@ develop a new k8s charm using the Operator Framework:
 """
 
 import logging
+from pathlib import Path
+import time
 
-from ops.charm import CharmBase
+from ops import pebble
+from ops.charm import (
+    CharmBase,
+    ConfigChangedEvent,
+    LeaderElectedEvent,
+    UpdateStatusEvent,
+    UpgradeCharmEvent,
+)
 from ops.framework import StoredState
 from ops.main import main
-from ops.model import ActiveStatus, BlockedStatus, WaitingStatus
+from ops.model import ActiveStatus, BlockedStatus, MaintenanceStatus, WaitingStatus
 
-from autoscaler import AutoScaler
 from config import JujuConfig, AutoscalerConfig
 from errors import ConfigError, JujuEnvironmentError
-from manifests import Manifests
 
 logger = logging.getLogger(__name__)
+CLOUD_CONFIG, MANIFESTS, RESOURCES = "cloud-config", "manifests", "resources"
+PARTS = {CLOUD_CONFIG, MANIFESTS, RESOURCES}
+# Cluster objects shared by every unit, reconciled by the leader alone
+LEADER_PARTS = {MANIFESTS, RESOURCES}
+# The parts of the workload each config option feeds, which are only reconciled when
+# pending: the cloud-config's endpoint probe and the leader's kubernetes objects. The
+# pebble layer and files are compared with the plan and pushed digests on every
+# reconcile instead, so options feeding only those affect no part
+AFFECTS = {
+    "api_endpoints": {CLOUD_CONFIG},
+    "ca_cert": {CLOUD_CONFIG},
+    "username": {CLOUD_CONFIG},
+    "password": {CLOUD_CONFIG},
+    "default_model_uuid": {CLOUD_CONFIG, MANIFESTS},
+    "scale": {CLOUD_CONFIG, MANIFESTS, RESOURCES},
+    "extra_args": set(),
+    "args_file": set(),
+    "profile": set(),
+    "resources": {RESOURCES},
+    "headroom": {MANIFESTS},
+    "reconcile_window": set(),
+    "drift_repair": {MANIFESTS},
+}
+WATCHER = Path(__file__).parent / "watcher.py"
+WATCHER_STATE = Path(".drift-watcher")
 
 
 class KubernetesAutoscalerCharm(CharmBase):
@@ -40,11 +72,30 @@ class KubernetesAutoscalerCharm(CharmBase):
         self.framework.observe(self.on.juju_autoscaler_pebble_ready, self._install_or_upgrade)
         self.framework.observe(self.on.config_changed, self._install_or_upgrade)
         self.framework.observe(self.on.leader_elected, self._set_version)
+        self.framework.observe(self.on.leader_elected, self._install_or_upgrade)
+        self.framework.observe(self.on.update_status, self._update_status)
+        self.framework.observe(self.on.leader_settings_changed, self._follow_leader)
         self.framework.observe(self.on.stop, self._cleanup)
+        self._stored.set_default(
+            fingerprint="",
+            pending=sorted(PARTS),
+            endpoints=[],
+            warning="",
+            applied=[],
+            audit=True,
+            windows=[],
+            reconciled_at=0.0,
+            deferred="",
+            reconciled=False,
+        )
         self._juju_config = JujuConfig(self._stored)
         self._autoscaler_config = AutoscalerConfig(self._stored)
 
-    def _install_or_upgrade(self, _event):
+    def _install_or_upgrade(self, event):
+        # Deferred so trivial hooks don't pay for importing lightkube
+        from autoscaler import AutoScaler
+        from pebble_state import PebbleState
+
         autoscaler = AutoScaler()
 
         try:
@@ -55,39 +106,230 @@ class KubernetesAutoscalerCharm(CharmBase):
         except (ConfigError, JujuEnvironmentError) as e:
             self.unit.status = BlockedStatus(str(e))
             return
+        finally:
+            self._mark_pending(event)
+
+        if self._throttled(event):
+            return
+        state = PebbleState(self.model.unit.get_container(self.CONTAINER), self._stored)
+        try:
+            self._reconcile(autoscaler, state, set(self._stored.pending))
+        finally:
+            logger.info("%s made %d pebble calls", type(event).__name__, state.calls)
+
+    def _mark_pending(self, event):
+        """Record the parts of the workload which need reconciling for this event.
+
+        Config-changed reconciles the parts its options affect, update-status none
+        and leader-elected the leader's parts, every other event reconciles
+        everything. Pending parts survive until a reconcile completes.
+
+        After an upgrade or election, objects may have been applied which this
+        unit's applied set doesn't record, so the next prune audits the inventory.
+        """
+        self._stored.reconciled = False
+        if isinstance(event, (LeaderElectedEvent, UpgradeCharmEvent)):
+            self._stored.audit = True
+        if isinstance(event, ConfigChangedEvent):
+            dirty = self._juju_config.dirty | self._autoscaler_config.dirty
+            parts = {part for key in dirty for part in AFFECTS[key]}
+        elif isinstance(event, UpdateStatusEvent):
+            parts = set()
+        elif isinstance(event, LeaderElectedEvent):
+            parts = LEADER_PARTS
+        else:
+            parts = PARTS
+        self._stored.pending = sorted(parts | set(self._stored.pending))
+
+    def _throttled(self, event):
+        """Defer reconciling within reconcile_window seconds of the last reconcile.
 
-        container = self.model.unit.get_container(self.CONTAINER)
-        if not container or not container.can_connect():
+        Pending parts accumulate meanwhile, carried by a single deferred event, so a
+        burst of events costs one further reconcile once the window has passed.
+        """
+        window = self._autoscaler_config["reconcile_window"]
+        elapsed = time.time() - self._stored.reconciled_at
+        if window <= 0 or elapsed >= window:
+            self._stored.deferred = ""
+            return False
+        if self._stored.deferred in ("", event.handle.path):
+            event.defer()
+            self._stored.deferred = event.handle.path
+        logger.info("Deferring reconcile of %s", ", ".join(["workload", *self._stored.pending]))
+        self.unit.status = WaitingStatus(f"Reconciling within {window - int(elapsed)}s")
+        return True
+
+    def _manifests(self):
+        from manifests import Manifests
+
+        default_model = self._juju_config["default_model_uuid"].cfg
+        return Manifests(
+            self,
+            headroom=self._autoscaler_config["headroom"].groups,
+            priorities=self._juju_config["scale"].priorities(default_model),
+        )
+
+    def _reconcile(self, autoscaler, state, pending):
+        if not state.connect():
             self.unit.status = WaitingStatus("Container Not Ready")
             return
 
-        path, file = autoscaler.binary.parent, autoscaler.binary.name
-        executable = container.list_files(path, pattern=file + "*")
-        if not executable:
-            self.unit.status = BlockedStatus(f"Image missing executable: {autoscaler.binary}")
+        for executable in autoscaler.executables:
+            if not state.has_executable(executable):
+                self.unit.status = BlockedStatus(f"Image missing executable: {executable}")
+                return
+
+        if state.fresh:
+            # probe the endpoints again for a new container
+            pending |= {CLOUD_CONFIG}
+        if not self.unit.is_leader():
+            # the leader applies them, a unit elected later is marked for them then
+            pending -= LEADER_PARTS
+            self._watch_drift(None)
+        self._rank_endpoints(autoscaler, CLOUD_CONFIG in pending)
+        logger.info("Reconciling %s", ", ".join(["workload", *sorted(pending)]))
+        manifests = self._manifests()
+        fingerprint = autoscaler.fingerprint(manifests.digest)
+        # the layer and files are always compared, as their content may change
+        # without any option changing, such as JUJU_API_ADDRESSES
+        changed = autoscaler.authorize(state)
+
+        if MANIFESTS in pending:
+            self._watch_drift(manifests)
+            manifests.apply_manifests()
+            manifests.prune(self._stored.applied, audit=self._unaudited)
+            self._stored.applied = manifests.applied
+            self._stored.audit = False
+        if RESOURCES in pending:
+            manifests.patch_pod_resources(self.CONTAINER, autoscaler.resources)
+
+        restart = changed or fingerprint != self._stored.fingerprint
+        if not state.ensure_running(state.name, restart=restart):
+            logger.info("Workload unchanged, skipping replan and restart")
+        self._stored.fingerprint = fingerprint
+        self._stored.pending = []
+        self._stored.reconciled = True
+        self._stored.reconciled_at = time.time()
+        self._stored.windows = self._juju_config["scale"].windows
+        self.unit.status = ActiveStatus(self._stored.warning)
+
+    @property
+    def _unaudited(self):
+        """Whether the inventory may hold objects the applied set doesn't record."""
+        return self._stored.audit or not self._stored.applied
+
+    def _watch_drift(self, manifests):
+        """Run the drift watcher from the manifest set about to be applied, if enabled.
+
+        The desired set is written first, so the watcher never restores objects
+        being replaced or pruned. Without manifests, any watcher is stopped.
+        """
+        import process
+
+        pidfile = WATCHER_STATE / "watcher.pid"
+        if manifests is None or not self._autoscaler_config["drift_repair"]:
+            process.stop(pidfile, WATCHER)
             return
+        desired = WATCHER_STATE / "desired.json"
+        manifests.store_desired(desired)
+        process.start(WATCHER, [desired], pidfile, WATCHER_STATE / "watcher.log")
+
+    def _watcher_down(self):
+        import process
+
+        if not (self.unit.is_leader() and self._autoscaler_config["drift_repair"]):
+            return False
+        return process.running(WATCHER_STATE / "watcher.pid", WATCHER) is None
+
+    def _rank_endpoints(self, autoscaler, probe):
+        """Order the cloud-config's endpoints by latency, probing them only if asked to.
+
+        Otherwise the previous ranking is reused, so the cloud-config is unchanged.
+        """
+        from probe import rank, reorder
+
+        endpoints = autoscaler.cloud_config["endpoints"]
+        if probe:
+            ranked, reachable = rank(endpoints)
+            self._stored.endpoints = ranked
+            self._stored.warning = "" if reachable else "No Juju API endpoint is reachable"
+        autoscaler.cloud_config["endpoints"] = reorder(endpoints, self._stored.endpoints)
+
+    def _follow_leader(self, _event=None):
+        """Stop repairing drift once no longer the leader, from a desired set now stale.
 
-        autoscaler.authorize(container)
+        Otherwise the watcher could restore objects the new leader has pruned.
+        """
+        if not self.unit.is_leader():
+            self._watch_drift(None)
 
-        manifests = Manifests(self)
-        manifests.apply_manifests()
+    def _update_status(self, event):
+        self._follow_leader()
+        scale = self._juju_config["scale"]
+        if scale.scheduled and scale.active() != list(self._stored.windows):
+            logger.info("Scheduled node group bounds changed")
+            self._install_or_upgrade(event)
+        elif self._watcher_down():
+            logger.info("Drift watcher isn't running, reapplying manifests")
+            self._stored.pending = sorted({MANIFESTS, *self._stored.pending})
+            self._install_or_upgrade(event)
+        self._check_health()
 
-        container.autostart()
-        container.restart(container.name)
-        self.unit.status = ActiveStatus()
+    def _check_health(self, _event=None):
+        """Surface the autoscaler's liveness check in the unit status.
+
+        Pebble restarts the service itself once the check is down, this only
+        reports on it. Skipped until a reconcile completes, such as while the config
+        is invalid, so their status stands.
+        """
+        if not self._stored.reconciled:
+            return
+        cont = self.model.unit.get_container(self.CONTAINER)
+        try:
+            checks = cont.get_checks(level=pebble.CheckLevel.ALIVE)
+        except (pebble.ConnectionError, pebble.APIError) as e:
+            logger.debug("Pebble API is not ready: %s", e)
+            self.unit.status = WaitingStatus("Container Not Ready")
+            return
+
+        down = sorted(
+            name for name, check in checks.items() if check.status == pebble.CheckStatus.DOWN
+        )
+        failing = {name: check for name, check in checks.items() if check.failures}
+        if down:
+            self.unit.status = MaintenanceStatus(
+                f"Restarting, health check down: {','.join(down)}"
+            )
+        elif failing:
+            self.unit.status = ActiveStatus(
+                "Health check failing: "
+                + ",".join(f"{n} ({c.failures}/{c.threshold})" for n, c in sorted(failing.items()))
+            )
+        else:
+            self.unit.status = ActiveStatus(self._stored.warning)
 
     def _set_version(self, _event=None):
         if self.unit.is_leader():
             self.unit.set_workload_version("Ready to Scale")
 
     def _cleanup(self, _):
+        # before any manifests are deleted, so they aren't repaired
+        self._watch_drift(None)
         cont = self.model.unit.get_container(self.CONTAINER)
         if cont and cont.can_connect() and cont.get_services(cont.name):
             cont.stop(cont.name)
 
         self.unit.status = WaitingStatus("Shutting down")
-        manifests = Manifests(self)
-        manifests.delete_manifest(ignore_unauthorized=True, ignore_not_found=True)
+        if self.app.planned_units() > 0:
+            # the remaining units still need the cluster objects
+            return
+        manifests = self._manifests()
+        manifests.delete_manifest(
+            ignore_unauthorized=True,
+            ignore_not_found=True,
+            previous=self._stored.applied,
+            audit=self._unaudited,
+        )
 
 
 if __name__ == "__main__":
@@ -1,9 +1,14 @@
 from functools import partial
+import hashlib
+from config.base import ConfigBase
 from config.scale import ConfigScale
 from config.controller import ConfigController
 from config.ca_cert import ConfigCaCert
 from config.uuid import ConfigUUID
 from config.key_value import KeyValue
+from config.headroom import ConfigHeadroom
+from config.profile import ConfigProfile
+from config.resources import ConfigResources
 
 
 class ConfigParser:
@@ -12,6 +17,7 @@ class ConfigParser:
     def __init__(self, prefix):
         self._prefix = prefix
         self._cached = {}
+        self.dirty = set()
 
     def keys(self):
         return self._types.keys()
@@ -21,22 +27,39 @@ class ConfigParser:
             value = self._cached[item]
         except KeyError:
             cast, _default = self._types[item]
-            value = cast(self._storage[item])
+            value = self._parse(item, cast, self._storage[item])
             self._cached[item] = value
         return value
 
+    def _parse(self, item, cast, raw):
+        """Cast a raw option, reusing the persisted parse if neither it nor the parser changed."""
+        parser = getattr(cast, "func", cast)
+        if not (isinstance(parser, type) and issubclass(parser, ConfigBase)):
+            return cast(raw)
+        digest = f"{parser.__name__}:{parser.VERSION}:{raw}"
+        digest = hashlib.sha256(digest.encode()).hexdigest()
+        parsed = self._parsed.get(item)
+        if parsed and parsed["digest"] == digest:
+            return cast(raw, cached=parsed["data"])
+        value = cast(raw)
+        self._parsed[item] = {"digest": digest, "data": value.normalized()}
+        return value
+
     def load(self, charm):
+        """Load charm config, recording each option which changed in self.dirty."""
+        self.dirty = set()
         for opt in self._types.keys():
             charm_cfg = charm.config.get(f"{self._prefix}{opt}")
             stored_cfg = self[opt]
             if charm_cfg != stored_cfg:
                 self._apply(opt, charm_cfg)
+                self.dirty.add(opt)
 
     def _apply(self, item, value):
         cast, as_default = self._types[item]
         as_default = type(as_default)
         if isinstance(value, as_default):
-            self._cached[item] = cast(value)
+            self._cached[item] = self._parse(item, cast, value)
             self._storage[item] = value
         else:
             raise TypeError(f"value {value} must be of type {as_default}")
@@ -45,17 +68,30 @@ class ConfigParser:
 
 
 class AutoscalerConfig(ConfigParser):
-    _types = {"extra_args": (partial(KeyValue, "autoscaler_extra_args"), "{}")}
+    _types = {
+        "extra_args": (partial(KeyValue, "autoscaler_extra_args"), "{}"),
+        "args_file": (bool, False),
+        "profile": (ConfigProfile, ""),
+        "resources": (ConfigResources, ""),
+        "headroom": (ConfigHeadroom, ""),
+        "reconcile_window": (int, 0),
+        "drift_repair": (bool, False),
+    }
 
     @property
     def _storage(self):
         return self._stored.autoscaler_config
 
+    @property
+    def _parsed(self):
+        return self._stored.autoscaler_config_parsed
+
     def __init__(self, storage):
         super(AutoscalerConfig, self).__init__("autoscaler_")
         self._stored = storage
         self._stored.set_default(
-            autoscaler_config={key: default for key, (cast, default) in self._types.items()}
+            autoscaler_config={key: default for key, (cast, default) in self._types.items()},
+            autoscaler_config_parsed={},
         )
 
 
@@ -73,11 +109,16 @@ class JujuConfig(ConfigParser):
     def _storage(self):
         return self._stored.juju_config
 
+    @property
+    def _parsed(self):
+        return self._stored.juju_config_parsed
+
     def __init__(self, storage):
         super(JujuConfig, self).__init__("juju_")
         self._stored = storage
         self._stored.set_default(
-            juju_config={key: default for key, (cast, default) in self._types.items()}
+            juju_config={key: default for key, (cast, default) in self._types.items()},
+            juju_config_parsed={},
         )
 
 
@@ -1,9 +1,20 @@
 from dataclasses import dataclass
+from typing import ClassVar
 
 
 @dataclass
 class ConfigBase:
     cfg: str
+    # Bump whenever parsing or the normalized form changes to invalidate cached parses
+    VERSION: ClassVar[int] = 1
+
+    def normalized(self):
+        """Validated, normalized form of cfg which can be persisted in StoredState.
+
+        Passed back to the constructor as ``cached`` to rebuild the instance
+        without parsing or validating cfg again.
+        """
+        return {}
 
     def __eq__(self, other):
         if isinstance(other, str):
@@ -8,8 +8,14 @@ logger = logging.getLogger(__name__)
 
 
 class ConfigCaCert(ConfigBase):
-    def __init__(self, cfg):
+    def normalized(self):
+        return {"decoded": self.decoded}
+
+    def __init__(self, cfg, cached=None):
         super().__init__(cfg)
+        if cached is not None:
+            self.decoded = cached["decoded"]
+            return
         try:
             self.decoded = base64.b64decode(cfg).decode("ascii")
         except binascii.Error as err:
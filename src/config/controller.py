@@ -28,8 +28,13 @@ class ConfigController(ConfigBase):
             return os.environ.get("JUJU_API_ADDRESSES", "").split(" ")
         return self._endpoints
 
-    def __init__(self, cfg):
+    def normalized(self):
+        return {"endpoints": self._endpoints}
+
+    def __init__(self, cfg, cached=None):
         super().__init__(cfg)
         self._endpoints = []
-        if cfg.strip() != "":
+        if cached is not None:
+            self._endpoints = list(cached["endpoints"])
+        elif cfg.strip() != "":
             self._endpoints = [self.invalid(parts.strip()) for parts in cfg.split(",") if parts]
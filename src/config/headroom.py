@@ -0,0 +1,60 @@
+import logging
+import yaml
+
+from errors import ConfigError
+from config.base import ConfigBase
+from config.resources import quantity
+
+logger = logging.getLogger(__name__)
+ERROR = "autoscaler_headroom invalid:"
+COUNTS = ("replicas", "nodes")
+KEYS = (*COUNTS, "cpu", "memory")
+
+
+def _validate(group, spec):
+    if not isinstance(spec, dict):
+        raise ConfigError(f"{ERROR} expected a mapping for {group}")
+    unknown = sorted(set(map(str, spec)) - set(KEYS))
+    if unknown:
+        raise ConfigError(f"{ERROR} unexpected keys {','.join(unknown)} for {group}")
+    counts = [key for key in COUNTS if key in spec]
+    if len(counts) != 1:
+        raise ConfigError(f"{ERROR} {group} needs exactly one of replicas or nodes")
+    count = spec[counts[0]]
+    if not isinstance(count, int) or isinstance(count, bool) or count <= 0:
+        raise ConfigError(f"{ERROR} {group} {counts[0]} must be a positive integer")
+    if not {"cpu", "memory"} & set(spec):
+        raise ConfigError(f"{ERROR} {group} needs cpu and/or memory")
+    for key in ("cpu", "memory"):
+        try:
+            if key in spec and quantity(spec[key]) <= 0:
+                raise ValueError(f"{spec[key]} must be greater than zero")
+        except ValueError as e:
+            raise ConfigError(f"{ERROR} {group} {key} {e}") from e
+    return {key: spec[key] if key in COUNTS else str(spec[key]) for key in spec}
+
+
+class ConfigHeadroom(ConfigBase):
+    """Placeholder capacity to keep free per node group, keyed by application."""
+
+    def normalized(self):
+        return {"groups": self.groups}
+
+    def __init__(self, cfg, cached=None):
+        super().__init__(cfg)
+        if cached is not None:
+            self.groups = {group: dict(spec) for group, spec in cached["groups"].items()}
+            return
+        self.groups = {}
+        try:
+            groups = yaml.safe_load(cfg.strip())
+        except yaml.YAMLError as e:
+            logger.error("invalid autoscaler_headroom configuration: %s", cfg)
+            raise ConfigError(f"{ERROR} not yaml or json format") from e
+
+        if groups is None:
+            return
+        elif not isinstance(groups, dict):
+            logger.error("invalid autoscaler_headroom configuration: %s", cfg)
+            raise ConfigError(f"{ERROR} yaml or json format - expected a mapping")
+        self.groups = {str(group): _validate(group, spec) for group, spec in groups.items()}
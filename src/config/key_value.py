@@ -32,9 +32,15 @@ class KeyValue(ConfigBase):
                 )
         return [(key, item) for item in val]
 
-    def __init__(self, config_id, cfg):
+    def normalized(self):
+        return {"key_values": [[key, value] for key, value in self.key_values]}
+
+    def __init__(self, config_id, cfg, cached=None):
         super().__init__(cfg)
         self.ERROR = f"{config_id} invalid:"
+        if cached is not None:
+            self.key_values = [(key, value) for key, value in cached["key_values"]]
+            return
         try:
             key_values = yaml.safe_load(cfg.strip())
         except yaml.YAMLError as e:
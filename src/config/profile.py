@@ -0,0 +1,73 @@
+import logging
+
+from errors import ConfigError
+from config.base import ConfigBase
+
+logger = logging.getLogger(__name__)
+
+# cluster-autoscaler flags set by each profile, autoscaler_extra_args take precedence
+PROFILES = {
+    # React to pending pods quickly, at the cost of more api traffic and keeping
+    # nodes around longer after a scale up
+    "low-latency": {
+        "scan-interval": "5s",
+        "new-pod-scale-up-delay": "0s",
+        "max-node-provision-time": "10m",
+        "scale-down-delay-after-add": "15m",
+        "scale-down-unneeded-time": "15m",
+        "kube-client-qps": 20,
+        "kube-client-burst": 40,
+    },
+    # The upstream defaults, pinned so they don't drift between autoscaler releases
+    "balanced": {
+        "scan-interval": "10s",
+        "max-node-provision-time": "15m",
+        "scale-down-delay-after-add": "10m",
+        "scale-down-unneeded-time": "10m",
+        "scale-down-utilization-threshold": "0.5",
+        "max-graceful-termination-sec": 600,
+        "kube-client-qps": 5,
+        "kube-client-burst": 10,
+    },
+    # Remove idle nodes aggressively, pending pods may wait for a fresh node more often
+    "cost-saver": {
+        "scan-interval": "10s",
+        "scale-down-delay-after-add": "5m",
+        "scale-down-unneeded-time": "5m",
+        "scale-down-utilization-threshold": "0.65",
+        "max-graceful-termination-sec": 300,
+        "max-drain-parallelism": 5,
+    },
+    # Scan less often and raise client limits so each scan completes on big clusters
+    "large-cluster": {
+        "scan-interval": "30s",
+        "max-node-provision-time": "20m",
+        "max-graceful-termination-sec": 600,
+        "max-scale-down-parallelism": 50,
+        "max-drain-parallelism": 10,
+        "kube-client-qps": 50,
+        "kube-client-burst": 100,
+    },
+}
+
+
+class ConfigProfile(ConfigBase):
+    def __init__(self, cfg, cached=None):
+        super().__init__(cfg)
+        self.name = cfg.strip()
+        if cached is None and self.name and self.name not in PROFILES:
+            logger.error("invalid autoscaler_profile configuration: %s", cfg)
+            raise ConfigError(
+                f"autoscaler_profile invalid: '{self.name}' is not one of {', '.join(PROFILES)}"
+            )
+
+    @property
+    def key_values(self):
+        return list(PROFILES.get(self.name, {}).items())
+
+    def merged(self, overrides):
+        """Profile flags beneath overrides, a key in overrides replaces every profile value."""
+        keys = {key for key, _ in overrides}
+        return [(key, value) for key, value in self.key_values if key not in keys] + list(
+            overrides
+        )
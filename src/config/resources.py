@@ -0,0 +1,71 @@
+import logging
+import re
+import yaml
+
+from errors import ConfigError
+from config.base import ConfigBase
+
+logger = logging.getLogger(__name__)
+ERROR = "autoscaler_resources invalid:"
+QUANTITY = re.compile(r"^([0-9]+(?:\.[0-9]+)?)(m|k|M|G|T|Ki|Mi|Gi|Ti)?$")
+SUFFIXES = {
+    None: 1,
+    "m": 1e-3,
+    "k": 1e3,
+    "M": 1e6,
+    "G": 1e9,
+    "T": 1e12,
+    "Ki": 2**10,
+    "Mi": 2**20,
+    "Gi": 2**30,
+    "Ti": 2**40,
+}
+
+
+def quantity(value):
+    """Value of a kubernetes resource quantity, such as 500m or 1Gi."""
+    match = QUANTITY.match(str(value).strip())
+    if not match:
+        raise ValueError(f"invalid quantity {value}")
+    number, suffix = match.groups()
+    return float(number) * SUFFIXES[suffix]
+
+
+class ConfigResources(ConfigBase):
+    KEYS = ("cpu", "memory")
+
+    def normalized(self):
+        return {"cpu": self.cpu, "memory": self.memory}
+
+    def __init__(self, cfg, cached=None):
+        super().__init__(cfg)
+        if cached is not None:
+            self.cpu, self.memory = cached["cpu"], cached["memory"]
+            return
+        self.cpu = self.memory = None
+        try:
+            resources = yaml.safe_load(cfg.strip())
+        except yaml.YAMLError as e:
+            logger.error("invalid autoscaler_resources configuration: %s", cfg)
+            raise ConfigError(f"{ERROR} not yaml or json format") from e
+
+        if resources is None:
+            return
+        elif not isinstance(resources, dict):
+            logger.error("invalid autoscaler_resources configuration: %s", cfg)
+            raise ConfigError(f"{ERROR} yaml or json format - expected a mapping")
+
+        unknown = sorted(set(map(str, resources)) - set(self.KEYS))
+        if unknown:
+            raise ConfigError(f"{ERROR} unexpected keys {','.join(unknown)}")
+        try:
+            values = {key: quantity(value) for key, value in resources.items()}
+        except ValueError as e:
+            raise ConfigError(f"{ERROR} {e}") from e
+        if not all(values.values()):
+            raise ConfigError(f"{ERROR} quantities must be greater than zero")
+        memory = values.get("memory")
+        if memory is not None and memory < 1:
+            raise ConfigError(f"{ERROR} memory must be at least 1 byte")
+        self.cpu = values.get("cpu")
+        self.memory = int(memory) if memory else None
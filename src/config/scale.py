@@ -1,16 +1,72 @@
 import logging
 import json
 import collections.abc
-from types import SimpleNamespace
+import re
+from typing import NamedTuple, Optional
 import yaml
 
 from errors import ConfigError
 from config.base import ConfigBase
+from config import schedule
+from config.resources import quantity
 from config.uuid import ConfigUUID
 
-
 logger = logging.getLogger(__name__)
 ERROR = "juju_scale invalid:"
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+TEMPLATE_KEYS = ("cpu", "memory", "gpu", "labels", "taints")
+TAINT_EFFECTS = ("NoSchedule", "PreferNoSchedule", "NoExecute")
+
+
+class NodeGroup(NamedTuple):
+    min: int
+    max: int
+    model: Optional[str]
+    application: str
+    template: Optional[dict] = None
+    priority: Optional[int] = None
+    schedule: Optional[list] = None
+
+
+def _taint(taint, cfg):
+    """Parse a taint written as kubectl does, <key>[=<value>]:<effect>."""
+    key_value, _, effect = str(taint).rpartition(":")
+    key, _, value = key_value.partition("=")
+    if not key or effect not in TAINT_EFFECTS:
+        raise ConfigError(f"{ERROR} taint should be <key>[=<value>]:<effect> - '{cfg()}'")
+    return {"key": key, "value": value, "effect": effect}
+
+
+def _template(template, cfg):
+    """Validate the shape of a node group's nodes, normalizing it for the provider."""
+    if not isinstance(template, collections.abc.Mapping):
+        raise ConfigError(f"{ERROR} template should be a mapping - '{cfg()}'")
+    unknown = sorted(set(map(str, template)) - set(TEMPLATE_KEYS))
+    if unknown:
+        raise ConfigError(f"{ERROR} unexpected template keys {','.join(unknown)} - '{cfg()}'")
+    try:
+        if not all(quantity(template[key]) > 0 for key in ("cpu", "memory")):
+            raise ValueError("cpu and memory must be greater than zero")
+    except KeyError as e:
+        raise ConfigError(f"{ERROR} template missing required element {e} - '{cfg()}'")
+    except ValueError as e:
+        raise ConfigError(f"{ERROR} template {e} - '{cfg()}'")
+    gpu = template.get("gpu", 0)
+    if not isinstance(gpu, int) or isinstance(gpu, bool) or gpu < 0:
+        raise ConfigError(f"{ERROR} template gpu should be a non-negative integer - '{cfg()}'")
+    labels = template.get("labels") or {}
+    if not isinstance(labels, collections.abc.Mapping):
+        raise ConfigError(f"{ERROR} template labels should be a mapping - '{cfg()}'")
+    taints = template.get("taints") or []
+    if not isinstance(taints, list):
+        raise ConfigError(f"{ERROR} template taints should be a list - '{cfg()}'")
+    return {
+        "cpu": str(template["cpu"]),
+        "memory": str(template["memory"]),
+        "gpu": gpu,
+        "labels": {str(key): str(value) for key, value in labels.items()},
+        "taints": [_taint(taint, cfg) for taint in taints],
+    }
 
 
 def _juju_scale_model_uuid(model, full_cfg):
@@ -20,45 +76,211 @@ def _juju_scale_model_uuid(model, full_cfg):
         raise ConfigError(f"{ERROR} Invalid model uuid - '{full_cfg}'")
 
 
-def _validate(_min, _max, app, model, cfg):
+def _bounds(_min, _max, cfg):
     try:
         _min, _max = int(_min), int(_max)
-    except ValueError:
+    except (TypeError, ValueError):
         _min, _max = -1, -1
-    if _min <= 0 or _max <= 0:
+    if _min < 0 or _max <= 0:
         raise ConfigError(
-            f"{ERROR} <min> & <max> must be non-negative, non-zero integers - '{cfg}'"
+            f"{ERROR} <min> & <max> must be non-negative integers, <max> non-zero - '{cfg()}'"
         )
     if _max <= _min:
-        raise ConfigError(f"{ERROR} <min> should be less than <max> - '{cfg}'")
-    return SimpleNamespace(min=_min, max=_max, model=model, application=app)
+        raise ConfigError(f"{ERROR} <min> should be less than <max> - '{cfg()}'")
+    return _min, _max
+
 
+def _window(window, cfg):
+    """Validate a scheduled override of a node group's bounds."""
+    if not isinstance(window, collections.abc.Mapping):
+        raise ConfigError(f"{ERROR} schedule entries should be mappings - '{cfg()}'")
+    try:
+        cron, length = window["cron"], window["duration"]
+        _min, _max = _bounds(window["min"], window["max"], cfg)
+    except KeyError as e:
+        raise ConfigError(f"{ERROR} schedule missing required element {e} - '{cfg()}'")
+    try:
+        schedule.Cron(str(cron))
+        length = schedule.duration(length)
+    except ValueError as e:
+        raise ConfigError(f"{ERROR} schedule {e} - '{cfg()}'")
+    return {"cron": str(cron), "duration": length, "min": _min, "max": _max}
+
+
+def _validate(_min, _max, app, model, template, priority, windows, cfg):
+    _min, _max = _bounds(_min, _max, cfg)
+    if windows is not None:
+        if not isinstance(windows, list):
+            raise ConfigError(f"{ERROR} schedule should be a list - '{cfg()}'")
+        windows = [_window(window, cfg) for window in windows]
+    if template is not None:
+        template = _template(template, cfg)
+    elif _min == 0 or any(window["min"] == 0 for window in windows or []):
+        # with no nodes to learn from, the autoscaler can't simulate scaling up
+        raise ConfigError(f"{ERROR} <min> of 0 requires a node template - '{cfg()}'")
+    if priority is not None and (not isinstance(priority, int) or isinstance(priority, bool)):
+        raise ConfigError(f"{ERROR} <priority> must be an integer - '{cfg()}'")
+    return NodeGroup(_min, _max, model, app, template, priority, windows)
+
+
+def _parse(cfg, models):
+    """Parse one node group, validating each distinct model uuid only once."""
+
+    def json_cfg():
+        # Only rendered for error messages
+        return json.dumps(cfg)
 
-def _parse(cfg):
-    json_cfg = json.dumps(cfg)
     if not isinstance(cfg, collections.abc.Mapping):
         raise ConfigError(f"{ERROR} Unexpected yaml collection type")
     try:
-        _min, _max, app = (cfg[k] for k in ["min", "max", "application"])
+        _min, _max, app = cfg["min"], cfg["max"], cfg["application"]
     except KeyError as e:
-        raise ConfigError(f"{ERROR} missing required element {e} - {json_cfg}")
+        raise ConfigError(f"{ERROR} missing required element {e} - {json_cfg()}")
     model = cfg.get("model")
-    model = _juju_scale_model_uuid(str(model), json_cfg) if model else None
-    return _validate(_min, _max, app, model, json_cfg)
+    if model:
+        model = str(model)
+        if model not in models:
+            models[model] = _juju_scale_model_uuid(model, json_cfg()).cfg
+        model = models[model]
+    else:
+        model = None
+    template, priority, windows = cfg.get("template"), cfg.get("priority"), cfg.get("schedule")
+    return _validate(_min, _max, app, model, template, priority, windows, json_cfg)
+
+
+def _escape(name):
+    # hyphens are literal outside a character class, keep juju names readable
+    return re.escape(name).replace("\\-", "-")
+
+
+def _check_unique(groups, default_model=None):
+    """Reject node groups which scale the same model's application more than once."""
+    seen = {}
+    for group in groups:
+        key = (group.model or default_model, group.application)
+        prior = seen.setdefault(key, group)
+        if prior is group:
+            continue
+        model, app = key
+        if (prior.min, prior.max) == (group.min, group.max):
+            raise ConfigError(f"{ERROR} duplicate node-group for {model or ''}:{app}")
+        raise ConfigError(
+            f"{ERROR} conflicting bounds for {model or ''}:{app} -"
+            f" {prior.min}:{prior.max} and {group.min}:{group.max}"
+        )
+
+
+def _load(cfg):
+    # json is far cheaper to parse than yaml, and most large configs are generated json
+    if cfg.startswith("["):
+        try:
+            return json.loads(cfg)
+        except ValueError:
+            pass
+    return yaml.load(cfg, Loader=SafeLoader)
+
+
+def _plain(value):
+    """Copy of a cached parse as plain dicts and lists, rather than StoredState's types."""
+    if isinstance(value, collections.abc.Mapping):
+        return {key: _plain(item) for key, item in value.items()}
+    elif isinstance(value, collections.abc.Sequence) and not isinstance(value, str):
+        return [_plain(item) for item in value]
+    return value
 
 
 class ConfigScale(ConfigBase):
-    def nodes(self, default_model=None):
+    VERSION = 5
+
+    def active(self, at=None):
+        """Index of the scheduled window in effect for each node group, None if none is."""
+        at = at or schedule.now()
         return [
-            f"{part.min}:{part.max}:{part.model or default_model}:{part.application}"
-            for part in self.scale
-            if (part.model or default_model)
+            (
+                next(
+                    (
+                        index
+                        for index, window in enumerate(group.schedule)
+                        if self._cron(window["cron"]).active(at, window["duration"])
+                    ),
+                    None,
+                )
+                if group.schedule
+                else None
+            )
+            for group in self.scale
         ]
 
-    def __init__(self, cfg):
+    def _cron(self, expression):
+        if expression not in self._crons:
+            self._crons[expression] = schedule.Cron(expression)
+        return self._crons[expression]
+
+    @property
+    def scheduled(self):
+        if self._scheduled is None:
+            self._scheduled = any(group.schedule for group in self.scale)
+        return self._scheduled
+
+    def nodes(self, default_model=None, at=None):
+        """Node group specs, with bounds from any scheduled window in effect at the time."""
+        active = tuple(self.active(at)) if self.scheduled else ()
+        self.windows = list(active)
+        try:
+            return self._nodes[default_model, active]
+        except KeyError:
+            pass
+        if default_model:
+            _check_unique(self.scale, default_model)
+        nodes = []
+        for group, window in zip(self.scale, active or [None] * len(self.scale)):
+            model = group.model or default_model
+            if not model:
+                continue
+            if window is None:
+                _min, _max = group.min, group.max
+            else:
+                _min, _max = group.schedule[window]["min"], group.schedule[window]["max"]
+            nodes.append(f"{_min}:{_max}:{model}:{group.application}")
+        self._nodes[default_model, active] = nodes
+        return nodes
+
+    def templates(self, default_model=None):
+        """Node templates keyed as <model>:<application>, for groups which have one."""
+        return {
+            f"{group.model or default_model}:{group.application}": group.template
+            for group in self.scale
+            if group.template and (group.model or default_model)
+        }
+
+    def priorities(self, default_model=None):
+        """Priority expander node group patterns, keyed by priority highest first.
+
+        Patterns match the group's application, optionally qualified by its model.
+        """
+        priorities = {}
+        for group in self.scale:
+            model = group.model or default_model
+            if group.priority is None or not model:
+                continue
+            pattern = f"^({_escape(model)}[:/])?{_escape(group.application)}$"
+            priorities.setdefault(group.priority, []).append(pattern)
+        return dict(sorted(priorities.items(), reverse=True))
+
+    def normalized(self):
+        return {"scale": [list(group) for group in self.scale]}
+
+    def __init__(self, cfg, cached=None):
         super().__init__(cfg)
+        self._nodes = {}
+        self._crons = {}
+        self._scheduled = None
+        self.windows = []
+        if cached is not None:
+            self.scale = [NodeGroup(*_plain(group)) for group in cached["scale"]]
+            return
         try:
-            scale = yaml.safe_load(cfg.strip())
+            scale = _load(cfg.strip())
         except yaml.YAMLError as e:
             logger.error("invalid juju_scale configuration: %s", cfg)
             raise ConfigError(f"{ERROR} not yaml or json format") from e
@@ -71,7 +293,9 @@ class ConfigScale(ConfigBase):
             raise ConfigError(f"{ERROR} yaml or json format - expected a list")
 
         try:
-            self.scale = [_parse(parts) for parts in scale]
+            models = {}
+            self.scale = [_parse(parts, models) for parts in scale]
+            _check_unique(self.scale)
         except ConfigError:
             logger.error("invalid juju_scale configuration: %s", cfg)
             raise
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta, timezone
+import re
+
+# minute, hour, day of month, month, day of week
+FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+NAMES = {
+    3: ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"],
+    4: ["sun", "mon", "tue", "wed", "thu", "fri", "sat"],
+}
+DURATION = re.compile(r"^(?:(\d+)d)?(?:(\d+)h)?(?:(\d+)m)?$")
+
+
+def now():
+    return datetime.now(timezone.utc)
+
+
+def _value(text, field):
+    names = NAMES.get(field, [])
+    if text.lower() in names:
+        return names.index(text.lower()) + (1 if field == 3 else 0)
+    return int(text)
+
+
+def _field(text, field):
+    """Values matched by one cron field, such as *, 1-5, */15 or mon,wed,fri."""
+    low, high = FIELDS[field]
+    values = set()
+    for part in text.split(","):
+        part, _, step = part.partition("/")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (_value(bound, field) for bound in part.split("-", 1))
+        else:
+            start = end = _value(part, field)
+        step = int(step) if step else 1
+        if not low <= start <= end <= high or step <= 0:
+            raise ValueError(f"'{text}' is out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    if field == 4 and 7 in values:
+        # both 0 and 7 are sunday
+        values = (values - {7}) | {0}
+    return values
+
+
+def duration(text):
+    """Seconds in a duration such as 90m, 10h or 1d12h."""
+    match = DURATION.match(str(text).strip())
+    if not match or not any(match.groups()):
+        raise ValueError(f"invalid duration '{text}'")
+    days, hours, minutes = (int(part or 0) for part in match.groups())
+    return int(timedelta(days=days, hours=hours, minutes=minutes).total_seconds())
+
+
+class Cron:
+    """Start times of a window, as a standard five field cron expression in UTC."""
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"'{expression}' should have 5 fields")
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            _field(text, field) for field, text in enumerate(fields)
+        )
+        # as cron does, restricting both day fields matches either of them
+        self._either_day = fields[2] != "*" and fields[4] != "*"
+
+    def _matches_day(self, day):
+        if day.month not in self.months:
+            return False
+        in_month = day.day in self.days
+        in_week = (day.weekday() + 1) % 7 in self.weekdays
+        return in_month or in_week if self._either_day else in_month and in_week
+
+    def latest(self, at, within):
+        """Most recent start at or before at, looking back no more than within seconds."""
+        earliest = at - timedelta(seconds=within)
+        day = at.replace(hour=0, minute=0, second=0, microsecond=0)
+        while day + timedelta(days=1) > earliest:
+            if self._matches_day(day):
+                for hour in sorted(self.hours, reverse=True):
+                    for minute in sorted(self.minutes, reverse=True):
+                        start = day.replace(hour=hour, minute=minute)
+                        if earliest <= start <= at:
+                            return start
+            day -= timedelta(days=1)
+        return None
+
+    def active(self, at, within):
+        """Whether a window of within seconds starting on this schedule covers at."""
+        start = self.latest(at, within)
+        return start is not None and at - start < timedelta(seconds=within)
@@ -7,9 +7,9 @@ logger = logging.getLogger(__name__)
 
 
 class ConfigUUID(ConfigBase):
-    def __init__(self, option, cfg):
+    def __init__(self, option, cfg, cached=None):
         super().__init__(cfg)
-        if cfg.strip() != "":
+        if cached is None and cfg.strip() != "":
             try:
                 uuid.UUID(cfg)
             except ValueError as err:
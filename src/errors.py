@@ -4,3 +4,9 @@ class JujuEnvironmentError(Exception):
 
 class ConfigError(Exception):
     pass
+
+
+class ManifestError(Exception):
+    def __init__(self, action, errors):
+        self.errors = errors
+        super().__init__(f"Failed to {action} {', '.join(sorted(errors))}")
@@ -1,44 +1,443 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
 import logging
+import os
 from pathlib import Path
 
 from lightkube import Client, codecs
 from lightkube.core.exceptions import ApiError
+from lightkube.core.resource import NamespacedResource
+from lightkube.resources.apps_v1 import StatefulSet
+import yaml
+
+from config.resources import quantity
+from errors import ManifestError
+from throttle import TIMEOUT, Retry, TokenBucket
 
 log = logging.getLogger(__file__)
+MANIFEST = Path("upstream", "manifests", "rendered.yaml")
+UPSTREAM_VERSION = Path("upstream", "version")
+MAX_WORKERS = 4
+# Api calls a hook may make unthrottled, enough to audit every kind and apply the set
+BURST = 24
+# Kinds which reference another managed object are applied in a later tier
+TIERS = {"ClusterRoleBinding": 1, "RoleBinding": 1, "Deployment": 1}
+UPSTREAM_LEASE = "cluster-autoscaler"
+PAUSE_IMAGE = "rocks.canonical.com/cdk/pause:3.9"
+PRIORITY_EXPANDER = "cluster-autoscaler-priority-expander"
+HEADROOM_LABEL = "kubernetes-autoscaler.juju.is/headroom"
+# Every managed object is labelled with its application's inventory and manifest revision
+INVENTORY_LABEL = "kubernetes-autoscaler.juju.is/inventory"
+REVISION_LABEL = "kubernetes-autoscaler.juju.is/revision"
+# Owner of the fields server-side apply sets, distinct from other lightkube clients
+FIELD_MANAGER = "kubernetes-autoscaler"
+LABEL_MAX = 63
+# Kinds applied only for some config, which an audit lists though absent from the set
+OPTIONAL_KINDS = {
+    ("v1", "ConfigMap"),
+    ("scheduling.k8s.io/v1", "PriorityClass"),
+    ("apps/v1", "Deployment"),
+}
+# Below the default of 0, so any real pod preempts the placeholders
+HEADROOM_PRIORITY = -10
+
+
+def _substitute(value, replacements):
+    """Replace placeholders field by field within a parsed manifest document."""
+    if isinstance(value, str):
+        for placeholder, replacement in replacements.items():
+            value = value.replace(placeholder, replacement)
+        return value
+    elif isinstance(value, dict):
+        return {key: _substitute(item, replacements) for key, item in value.items()}
+    elif isinstance(value, list):
+        return [_substitute(item, replacements) for item in value]
+    return value
+
+
+def _inventory_id(namespace, application):
+    """Label value identifying the objects one application manages."""
+    inventory = f"{namespace}.{application}"
+    if len(inventory) > LABEL_MAX:
+        inventory = hashlib.sha256(inventory.encode()).hexdigest()[:LABEL_MAX]
+    return inventory
+
+
+def _labelled(doc, labels):
+    metadata = doc.setdefault("metadata", {})
+    metadata["labels"] = {**(metadata.get("labels") or {}), **labels}
+    return doc
+
+
+def _tiers(resources):
+    """Group resources into dependency ordered tiers."""
+    tiers = {}
+    for obj in resources:
+        tiers.setdefault(TIERS.get(obj.kind, 0), []).append(obj)
+    return [tiers[tier] for tier in sorted(tiers)]
+
+
+def _headroom(namespace, application, groups):
+    """PriorityClass and pause pod Deployments which hold capacity on each node group.
+
+    Pods are spread one per node when a group's headroom is counted in nodes.
+    """
+    if not groups:
+        return []
+    priority_class = f"{namespace}-{application}-headroom"
+    documents = [
+        {
+            "apiVersion": "scheduling.k8s.io/v1",
+            "kind": "PriorityClass",
+            "metadata": {"name": priority_class, "labels": {HEADROOM_LABEL: application}},
+            "value": HEADROOM_PRIORITY,
+            "globalDefault": False,
+            "preemptionPolicy": "Never",
+            "description": f"Placeholder pods holding headroom for {application}",
+        }
+    ]
+    for group, spec in sorted(groups.items()):
+        labels = {HEADROOM_LABEL: application, f"{HEADROOM_LABEL}-group": group}
+        requests = {key: spec[key] for key in ("cpu", "memory") if key in spec}
+        pod = {
+            "priorityClassName": priority_class,
+            "terminationGracePeriodSeconds": 0,
+            "nodeSelector": {"juju-application": group},
+            "containers": [
+                {
+                    "name": "pause",
+                    "image": PAUSE_IMAGE,
+                    "resources": {"requests": requests, "limits": requests},
+                }
+            ],
+        }
+        if "nodes" in spec:
+            term = {
+                "labelSelector": {"matchLabels": labels},
+                "topologyKey": "kubernetes.io/hostname",
+            }
+            pod["affinity"] = {
+                "podAntiAffinity": {"requiredDuringSchedulingIgnoredDuringExecution": [term]}
+            }
+        documents.append(
+            {
+                "apiVersion": "apps/v1",
+                "kind": "Deployment",
+                "metadata": {
+                    "name": f"{application}-headroom-{group}",
+                    "namespace": namespace,
+                    "labels": labels,
+                },
+                "spec": {
+                    "replicas": spec.get("nodes", spec.get("replicas")),
+                    "selector": {"matchLabels": labels},
+                    "template": {"metadata": {"labels": labels}, "spec": pod},
+                },
+            }
+        )
+    return documents
+
+
+def _grant_lease(doc, application):
+    """Extend the upstream ClusterRole's lease rule to the application's own lease.
+
+    Upstream grants only the lease named cluster-autoscaler, the autoscaler holds
+    one named after its application instead.
+    """
+    if doc.get("kind") == "ClusterRole":
+        for rule in doc.get("rules") or []:
+            names = rule.get("resourceNames") or []
+            if "leases" in rule.get("resources", []) and UPSTREAM_LEASE in names:
+                rule["resourceNames"] = sorted({*names, application})
+    return doc
+
+
+def _priority_expander(namespace, priorities):
+    """ConfigMap read by cluster-autoscaler's priority expander."""
+    if not priorities:
+        return []
+    return [
+        {
+            "apiVersion": "v1",
+            "kind": "ConfigMap",
+            "metadata": {"name": PRIORITY_EXPANDER, "namespace": namespace},
+            "data": {"priorities": yaml.safe_dump(priorities)},
+        }
+    ]
+
+
+def _quantities(resources):
+    """Comparable form of a container's resources, whichever units the server reports."""
+    return {
+        kind: {name: quantity(value) for name, value in (resources.get(kind) or {}).items()}
+        for kind in ("requests", "limits")
+    }
+
+
+def _execute(action, func, tiers):
+    """Run func on each object, concurrently within a tier, one tier at a time.
+
+    Every object is attempted, errors are collected per object and raised together
+    once all tiers have completed.
+    """
+    errors = {}
+    for tier in tiers:
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(tier))) as pool:
+            futures = {f"{obj.kind}/{obj.metadata.name}": pool.submit(func, obj) for obj in tier}
+        for key, future in futures.items():
+            if future.exception():
+                errors[key] = future.exception()
+    if errors:
+        raise ManifestError(action, errors)
 
 
 class Manifests:
-    def __init__(self, charm):
+    cache_dir = Path(".manifest-cache")
+    # Bump whenever compiling changes what is cached, to invalidate compiled manifests
+    VERSION = 1
+
+    def __init__(self, charm, client=None, headroom=None, priorities=None):
         self.namespace = charm.model.name
         self.application = charm.model.app.name
-        self.client = Client(namespace=self.namespace, field_manager="lightkube")
+        self.headroom = headroom or {}
+        self.priorities = priorities or {}
+        self.inventory = _inventory_id(self.namespace, self.application)
+        self.client = client or Client(
+            namespace=self.namespace, field_manager=FIELD_MANAGER, timeout=TIMEOUT
+        )
+        self.retry = Retry(TokenBucket(burst=BURST))
+        self._resources = None
+
+    @property
+    def digest(self):
+        """Digest of the manifest set this application would apply.
+
+        Keyed by the rendered manifest file, the namespace, the application and
+        the version of compiling.
+        """
+        digest = hashlib.sha256(MANIFEST.read_bytes())
+        for part in (self.namespace, self.application, str(self.VERSION)):
+            digest.update(b"\0" + part.encode())
+        return digest.hexdigest()
+
+    @property
+    def labels(self):
+        """Labels on every managed object, the application's inventory and manifest revision."""
+        return {INVENTORY_LABEL: self.inventory, REVISION_LABEL: self.revision}
+
+    @property
+    def revision(self):
+        return UPSTREAM_VERSION.read_text().strip()
+
+    @property
+    def resources(self):
+        """Ready-to-apply lightkube objects for this application.
+
+        The parsed and substituted manifest set is cached on disk as json, so only
+        the first hook after the manifest, namespace or application changes pays
+        for parsing the yaml, and replaces any older set. The application's lease
+        is granted on top, and any priority expander config and headroom
+        placeholders follow it. Each is labelled with the inventory.
+        """
+        if self._resources is None:
+            cached = Path(self.cache_dir, f"{self.digest}.json")
+            try:
+                documents = json.loads(cached.read_text())
+            except (OSError, ValueError):
+                documents = self._compile()
+                self._store(cached, documents)
+                self._evict(cached)
+            documents = [_grant_lease(doc, self.application) for doc in documents]
+            documents += _priority_expander(self.namespace, self.priorities)
+            documents += _headroom(self.namespace, self.application, self.headroom)
+            labels = self.labels
+            self._resources = [codecs.from_dict(_labelled(doc, labels)) for doc in documents]
+        return self._resources
+
+    @property
+    def applied(self):
+        """Identity of each resource, as [apiVersion, kind, name], for pruning later."""
+        return [[obj.apiVersion, obj.kind, obj.metadata.name] for obj in self.resources]
+
+    def _compile(self):
+        replacements = {
+            "juju-application-placeholder": self.application,
+            "juju-namespace-placeholder": self.namespace,
+        }
+        return [
+            _substitute(doc, replacements)
+            for doc in yaml.safe_load_all(MANIFEST.read_text())
+            if doc
+        ]
+
+    @staticmethod
+    def _store(cached, documents):
+        tmp = cached.with_suffix(".tmp")
+        try:
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(documents))
+            os.replace(tmp, cached)
+        except OSError:
+            log.warning("Unable to cache compiled manifests at %s", cached)
+
+    @staticmethod
+    def _evict(cached):
+        """Remove every compiled manifest set but this one."""
+        for stale in cached.parent.glob("*.json"):
+            if stale != cached:
+                stale.unlink(missing_ok=True)
+
+    def store_desired(self, path):
+        """Write the manifest set as json, for the drift watcher to repair objects from."""
+        desired = {
+            "namespace": self.namespace,
+            "inventory": self.inventory,
+            "documents": [obj.to_dict() for obj in self.resources],
+        }
+        self._store(Path(path), desired)
 
     def apply_manifests(self):
-        with open(Path("upstream", "manifests", "rendered.yaml")) as f:
-            text = f.read()
-            text = text.replace("juju-application-placeholder", self.application)
-            text = text.replace("juju-namespace-placeholder", self.namespace)
-        for obj in codecs.load_all_yaml(text):
-            self.delete_resource(
-                type(obj),
-                obj.metadata.name,
-                ignore_not_found=True,
-            )
-            self.client.create(obj)
-
-    def delete_manifest(self, namespace=None, ignore_not_found=False, ignore_unauthorized=False):
-        with open(Path("upstream", "manifests", "rendered.yaml")) as f:
-            text = f.read()
-            text = text.replace("juju-application-placeholder", self.application)
-            text = text.replace("juju-namespace-placeholder", self.namespace)
-        for obj in codecs.load_all_yaml(text):
-            self.delete_resource(
-                type(obj),
-                obj.metadata.name,
-                namespace=namespace,
-                ignore_not_found=ignore_not_found,
-                ignore_unauthorized=ignore_unauthorized,
+        _execute("apply", self.apply_resource, _tiers(self.resources))
+
+    def delete_manifest(
+        self,
+        namespace=None,
+        ignore_not_found=False,
+        ignore_unauthorized=False,
+        previous=None,
+        audit=False,
+    ):
+        """Delete the manifest set, and anything left in the inventory from previous.
+
+        The inventory is only listed if previous, as returned by applied, differs
+        from the current set, as that's the only way objects can be left behind,
+        or if audit because previous isn't known to be complete.
+        """
+        ignore = dict(ignore_not_found=ignore_not_found, ignore_unauthorized=ignore_unauthorized)
+
+        def delete(obj):
+            self.delete_resource(type(obj), obj.metadata.name, namespace=namespace, **ignore)
+
+        _execute("delete", delete, reversed(_tiers(self.resources)))
+        previous = previous or []
+        if not (audit or self._changed_since(previous)):
+            return
+        try:
+            leftovers = self._inventory(self._kinds(previous, audit))
+        except ApiError as err:
+            if ignore_unauthorized and "(unauthorized)" in (err.status.message or "").lower():
+                log.warning(f"Ignoring unauthorized error: {err.status.message}")
+                return
+            raise
+        for (_, kind, name), (resource_type, obj_namespace, revision) in leftovers.items():
+            log.info("Deleting leftover %s/%s from revision %s", kind, name, revision)
+            self.delete_resource(resource_type, name, namespace=obj_namespace, **ignore)
+
+    def prune(self, previous, audit=False):
+        """Delete objects in the inventory which are no longer in the manifest set.
+
+        previous is applied as it was when last reconciled. Nothing is listed unless
+        the set has changed since, otherwise each kind in either is listed once by
+        the inventory label, and only the stale objects are deleted. An audit, for
+        when previous may be incomplete or unknown, lists every kind which could
+        be managed regardless.
+        """
+        if not (audit or self._changed_since(previous)):
+            return
+        current = {tuple(key) for key in self.applied}
+        stale = {
+            key: found
+            for key, found in self._inventory(self._kinds(previous, audit)).items()
+            if key not in current
+        }
+        for api_version, kind, name in previous:
+            # objects applied before they were labelled are only known by name
+            if (api_version, kind, name) not in current:
+                resource_type = codecs.resource_registry.load(api_version, kind)
+                stale.setdefault((api_version, kind, name), (resource_type, None, None))
+        for (_, kind, name), (resource_type, namespace, revision) in sorted(stale.items()):
+            log.info("Pruning %s/%s from revision %s", kind, name, revision or "unknown")
+            self.delete_resource(resource_type, name, namespace=namespace, ignore_not_found=True)
+
+    def _changed_since(self, previous):
+        """Whether the manifest set differs from a previously applied one.
+
+        Nothing was applied before an empty previous, such as on install.
+        """
+        if not previous:
+            return False
+        return {tuple(key) for key in previous} != {tuple(key) for key in self.applied}
+
+    def _kinds(self, previous, audit=False):
+        kinds = {(api_version, kind) for api_version, kind, _ in [*self.applied, *previous]}
+        return kinds | OPTIONAL_KINDS if audit else kinds
+
+    def _inventory(self, kinds):
+        """Objects labelled with this application's inventory, listing each kind once.
+
+        Keyed by [apiVersion, kind, name] as in applied, with their type, namespace
+        and the manifest revision which applied them.
+        """
+        selector = {INVENTORY_LABEL: self.inventory}
+
+        def listed(kind):
+            resource_type = codecs.resource_registry.load(*kind)
+            namespaced = issubclass(resource_type, NamespacedResource)
+            namespace = self.namespace if namespaced else None
+            objs = self.client.list(resource_type, namespace=namespace, labels=selector)
+            return [
+                (
+                    (*kind, obj.metadata.name),
+                    (resource_type, namespace, (obj.metadata.labels or {}).get(REVISION_LABEL)),
+                )
+                for obj in objs
+            ]
+
+        kinds = sorted(kinds)
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(kinds) or 1)) as pool:
+            found = pool.map(lambda kind: self.retry(listed, kind), kinds)
+        return dict(item for items in found for item in items)
+
+    def patch_pod_resources(self, container, resources):
+        """Set the resources of one of this application's pod containers.
+
+        The StatefulSet is only patched when they differ, as patching it replaces
+        the pod. Returns True when it was patched.
+        """
+        sts = self.retry(self.client.get, StatefulSet, self.application, namespace=self.namespace)
+        current = next(
+            (c.resources for c in sts.spec.template.spec.containers if c.name == container), None
+        )
+        if current is not None and _quantities(
+            {"requests": current.requests, "limits": current.limits}
+        ) == _quantities(resources):
+            return False
+        log.info("Patching %s resources to %s", container, resources)
+        patch = {
+            "spec": {
+                "template": {"spec": {"containers": [{"name": container, "resources": resources}]}}
+            }
+        }
+        self.retry(
+            self.client.patch, StatefulSet, self.application, patch, namespace=self.namespace
+        )
+        return True
+
+    def apply_resource(self, obj):
+        """Server-side apply a resource, taking ownership of any conflicting fields.
+
+        Unchanged objects are a no-op on the API server, and existing objects are
+        patched in place so the running autoscaler never loses its RBAC.
+        """
+        try:
+            self.retry(self.client.apply, obj, force=True)
+        except ApiError as err:
+            log.exception(
+                "ApiError encountered while attempting to apply resource: %s",
+                err.status.message or f"{obj.kind}/{obj.metadata.name}",
             )
+            raise
 
     def delete_resource(
         self,
@@ -50,7 +449,7 @@ class Manifests:
     ):
         """Delete a resource."""
         try:
-            self.client.delete(resource_type, name, namespace=namespace)
+            self.retry(self.client.delete, resource_type, name, namespace=namespace)
         except ApiError as err:
             if err.status.message is not None:
                 err_lower = err.status.message.lower()
@@ -0,0 +1,111 @@
+import hashlib
+import logging
+
+from ops import pebble
+
+logger = logging.getLogger(__name__)
+
+
+class PebbleState:
+    """Reconcile a workload container with as few Pebble calls as possible.
+
+    Facts which only change when the container is replaced (executables in the
+    image, files already pushed) are remembered in the charm's StoredState. Pebble
+    doesn't persist dynamically added layers, so a plan without the container's
+    service means a new container, possibly from a new image, and those facts are
+    forgotten.
+    """
+
+    def __init__(self, container, stored):
+        self._container = container
+        self._stored = stored
+        self._stored.set_default(pebble_executables=[], pebble_pushed={})
+        self._plan = None
+        self.fresh = False
+        self.calls = 0
+
+    @property
+    def name(self):
+        return self._container.name
+
+    def _call(self, method, *args, **kwargs):
+        self.calls += 1
+        return getattr(self._container, method)(*args, **kwargs)
+
+    def connect(self):
+        """Fetch the current plan, which doubles as the connectivity check."""
+        try:
+            self._plan = self._call("get_plan")
+        except (pebble.ConnectionError, pebble.APIError, FileNotFoundError) as e:
+            logger.debug("Pebble API is not ready: %s", e)
+            return False
+        self.fresh = self.name not in self._plan.services
+        if self.fresh:
+            self._stored.pebble_executables = []
+            self._stored.pebble_pushed = {}
+        return True
+
+    def has_executable(self, binary):
+        """Check whether the image provides binary, listing files only once per container."""
+        if str(binary) in self._stored.pebble_executables:
+            return True
+        try:
+            found = self._call("list_files", binary.parent, pattern=binary.name)
+        except pebble.APIError:
+            # the containing directory doesn't exist
+            found = []
+        if not found:
+            return False
+        self._stored.pebble_executables.append(str(binary))
+        return True
+
+    def ensure_layer(self, label, layer):
+        """Add the layer only when the plan's services or checks differ from it.
+
+        A plan reporting no checks at all is compared on its services alone, a
+        layer which predates the checks also lacks the services' on-check-failure.
+
+        Returns True when the plan was changed.
+        """
+        desired = pebble.Layer(layer)
+        services = self._plan.services if self._plan else {}
+        checks = self._plan.checks if self._plan else {}
+        if all(
+            name in services and services[name].to_dict() == service.to_dict()
+            for name, service in desired.services.items()
+        ) and (
+            not checks
+            or all(
+                name in checks and checks[name].to_dict() == check.to_dict()
+                for name, check in desired.checks.items()
+            )
+        ):
+            return False
+        self._call("add_layer", label, layer, combine=True)
+        return True
+
+    def ensure_file(self, path, content, **kwargs):
+        """Push content only when its digest differs from what was last pushed.
+
+        Returns True when the file was pushed.
+        """
+        digest = hashlib.sha256(content.encode()).hexdigest()
+        if self._stored.pebble_pushed.get(path) == digest:
+            return False
+        self._call("push", path, content, **kwargs)
+        self._stored.pebble_pushed[path] = digest
+        return True
+
+    def ensure_running(self, service, restart=False):
+        """Restart the service when required, otherwise only start it if it isn't running.
+
+        Returns True when the service was (re)started.
+        """
+        if restart:
+            self._call("restart", service)
+            return True
+        info = self._call("get_services", service).get(service)
+        if info and info.is_running():
+            return False
+        self._call("start", service)
+        return True
@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from socket import create_connection
+import time
+
+logger = logging.getLogger(__name__)
+TIMEOUT = 1.0
+# Latencies in the same bucket keep their configured order, so jitter between
+# reconciles doesn't reorder the cloud-config and restart the autoscaler
+BUCKET = 0.01
+
+
+def _address(endpoint):
+    host, _, port = endpoint.rpartition(":")
+    return host.strip("[]"), int(port)
+
+
+def latency(endpoint, timeout=TIMEOUT):
+    """Seconds taken to open a tcp connection to endpoint, or None if it's unreachable."""
+    start = time.perf_counter()
+    try:
+        create_connection(_address(endpoint), timeout=timeout).close()
+    except (OSError, ValueError) as e:
+        logger.warning("Juju API endpoint %s is unreachable: %s", endpoint, e)
+        return None
+    return time.perf_counter() - start
+
+
+def rank(endpoints, timeout=TIMEOUT):
+    """Probe endpoints concurrently, ordering them fastest first and unreachable last.
+
+    Returns the ranked endpoints and how many of them were reachable.
+    """
+    if not endpoints:
+        return [], 0
+    with ThreadPoolExecutor(max_workers=len(endpoints)) as pool:
+        latencies = list(pool.map(lambda endpoint: latency(endpoint, timeout), endpoints))
+    reachable = sorted(
+        (int(seconds // BUCKET), index)
+        for index, seconds in enumerate(latencies)
+        if seconds is not None
+    )
+    order = [index for _, index in reachable]
+    order += [index for index, seconds in enumerate(latencies) if seconds is None]
+    return [endpoints[index] for index in order], len(reachable)
+
+
+def reorder(endpoints, ranked):
+    """Order endpoints as a previous rank did, without probing them again."""
+    position = {endpoint: index for index, endpoint in enumerate(ranked)}
+    return sorted(endpoints, key=lambda endpoint: position.get(endpoint, len(position)))
@@ -0,0 +1,45 @@
+"""Helper processes which outlive the hook that starts them."""
+
+import os
+from pathlib import Path
+import signal
+import subprocess
+import sys
+
+
+def running(pidfile, script):
+    """Pid recorded in pidfile, if that process is still running script."""
+    try:
+        pid = int(Path(pidfile).read_text())
+        cmdline = Path("/proc", str(pid), "cmdline").read_bytes()
+    except (OSError, ValueError):
+        return None
+    return pid if str(script).encode() in cmdline.split(b"\0") else None
+
+
+def start(script, args, pidfile, logfile):
+    """Run a python script detached from the hook, replacing any instance already running."""
+    stop(pidfile, script)
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    Path(pidfile).parent.mkdir(parents=True, exist_ok=True)
+    with open(logfile, "ab") as log:
+        process = subprocess.Popen(
+            [sys.executable, str(script), *map(str, args)],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            env=env,
+            start_new_session=True,
+        )
+    Path(pidfile).write_text(str(process.pid))
+    return process.pid
+
+
+def stop(pidfile, script):
+    pid = running(pidfile, script)
+    if pid is not None:
+        os.kill(pid, signal.SIGTERM)
+    try:
+        Path(pidfile).unlink()
+    except FileNotFoundError:
+        pass
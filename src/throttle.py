@@ -0,0 +1,77 @@
+import logging
+import random
+import threading
+import time
+
+import httpx
+from lightkube.core.exceptions import ApiError
+
+logger = logging.getLogger(__name__)
+RETRYABLE = {429, 500, 502, 503, 504}
+TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+
+class TokenBucket:
+    """Client-side rate limiter shared by every thread making api calls."""
+
+    def __init__(self, rate=10.0, burst=10, clock=time.monotonic, sleep=time.sleep):
+        self.rate, self.burst = rate, burst
+        self._clock, self._sleep = clock, sleep
+        self._tokens, self._updated = float(burst), clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, waiting until one is available."""
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+class Retry:
+    """Retry retryable api failures with full-jitter exponential backoff.
+
+    A Retry-After header from the api server takes precedence over the computed delay.
+    """
+
+    def __init__(self, limiter, attempts=5, base=0.5, cap=8.0, sleep=time.sleep):
+        self.limiter = limiter
+        self.attempts, self.base, self.cap = attempts, base, cap
+        self._sleep = sleep
+
+    def delay(self, attempt, err):
+        response = getattr(err, "response", None)
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.cap)
+        return random.uniform(0, min(self.cap, self.base * 2**attempt))
+
+    @staticmethod
+    def retryable(err):
+        if isinstance(err, ApiError):
+            return err.status.code in RETRYABLE
+        return isinstance(err, httpx.TransportError)
+
+    def __call__(self, func, *args, **kwargs):
+        for attempt in range(self.attempts):
+            self.limiter.acquire()
+            try:
+                return func(*args, **kwargs)
+            except (ApiError, httpx.TransportError) as err:
+                if not self.retryable(err) or attempt == self.attempts - 1:
+                    raise
+                delay = self.delay(attempt, err)
+                logger.warning(
+                    "Retrying %s in %.2fs after attempt %d failed: %s",
+                    getattr(func, "__name__", func),
+                    delay,
+                    attempt + 1,
+                    err,
+                )
+                self._sleep(delay)
@@ -0,0 +1,161 @@
+"""Repair drift in the managed kubernetes objects as soon as it happens.
+
+Run detached from the leader unit's hooks, it lists then watches each managed
+kind by the inventory label, and applies the desired object again whenever one
+is deleted or no longer carries a field it should. The desired set is reread
+from the file the charm writes before every manifest reconcile.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+from pathlib import Path
+import sys
+import time
+
+from lightkube import Client, codecs
+from lightkube.core.exceptions import ApiError
+from lightkube.core.resource import NamespacedResource
+
+from config.resources import quantity
+from manifests import FIELD_MANAGER, INVENTORY_LABEL
+from throttle import Retry, TokenBucket
+
+logger = logging.getLogger(__name__)
+# Pause before watching a kind again after an unexpected failure
+BACKOFF = 5.0
+GONE = 410
+# Fields holding maps of resource quantities
+QUANTITIES = {"requests", "limits"}
+
+
+def _same_quantity(live, desired):
+    try:
+        return quantity(live) == quantity(desired)
+    except ValueError:
+        return False
+
+
+def _covers(live, desired, quantities=False):
+    """Whether the live object still carries every field the desired one sets.
+
+    Container requests and limits compare by value, as the server rewrites
+    quantities in canonical form, such as 0.5 as 500m.
+    """
+    if isinstance(desired, dict):
+        return isinstance(live, dict) and all(
+            key in live and _covers(live[key], value, quantities or key in QUANTITIES)
+            for key, value in desired.items()
+        )
+    elif isinstance(desired, list):
+        return (
+            isinstance(live, list)
+            and len(live) == len(desired)
+            and all(_covers(item, value) for item, value in zip(live, desired))
+        )
+    return live == desired or (quantities and _same_quantity(live, desired))
+
+
+class Desired:
+    """The manifest set the charm last applied, reloaded whenever the file changes."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._mtime = None
+        self.namespace = self.inventory = None
+        self.documents = {}
+        self.load()
+
+    def load(self):
+        mtime = self.path.stat().st_mtime_ns
+        if mtime != self._mtime:
+            stored = json.loads(self.path.read_text())
+            self.namespace, self.inventory = stored["namespace"], stored["inventory"]
+            self.documents = {
+                (doc["apiVersion"], doc["kind"], doc["metadata"]["name"]): doc
+                for doc in stored["documents"]
+            }
+            self._mtime = mtime
+        return self.documents
+
+    @property
+    def kinds(self):
+        return sorted({(api_version, kind) for api_version, kind, _ in self.load()})
+
+
+class Watcher:
+    def __init__(self, desired, client, retry=None):
+        self.desired = desired
+        self.client = client
+        self.retry = retry or Retry(TokenBucket())
+
+    def _restore(self, key, reason):
+        logger.warning("Repairing %s %s/%s", reason, key[1], key[2])
+        doc = self.desired.documents[key]
+        self.retry(self.client.apply, codecs.from_dict(doc), force=True)
+
+    def repair(self, kind, event, obj):
+        """Apply the desired object again if this event shows it drifted.
+
+        Returns True when it was applied.
+        """
+        key = (*kind, obj.metadata.name)
+        doc = self.desired.load().get(key)
+        if doc is None or (event != "DELETED" and _covers(obj.to_dict(), doc)):
+            return False
+        self._restore(key, event.lower())
+        return True
+
+    def resync(self, kind, resource_type, namespace):
+        """List the kind, repairing what drifted or is missing, returning the list's version."""
+        labels = {INVENTORY_LABEL: self.desired.inventory}
+        listed = self.client.list(resource_type, namespace=namespace, labels=labels)
+        seen = set()
+        for obj in listed:
+            seen.add(obj.metadata.name)
+            self.repair(kind, "MODIFIED", obj)
+        for key in self.desired.load():
+            if key[:2] == kind and key[2] not in seen:
+                self._restore(key, "missing")
+        return listed.resourceVersion
+
+    def watch(self, kind):
+        """Repair objects of one kind as events arrive, relisting whenever the watch expires.
+
+        Events resume from the version of the last one seen, from the list at first.
+        """
+        resource_type = codecs.resource_registry.load(*kind)
+        namespaced = issubclass(resource_type, NamespacedResource)
+        namespace = self.desired.namespace if namespaced else None
+        while True:
+            try:
+                version = self.resync(kind, resource_type, namespace)
+                labels = {INVENTORY_LABEL: self.desired.inventory}
+                for event, obj in self.client.watch(
+                    resource_type, namespace=namespace, labels=labels, resource_version=version
+                ):
+                    self.repair(kind, event, obj)
+            except ApiError as err:
+                if err.status.code == GONE:
+                    logger.info("Watch of %s expired, listing again", kind[1])
+                    continue
+                logger.warning("Watch of %s failed: %s", kind[1], err)
+            except Exception:
+                logger.exception("Watch of %s failed", kind[1])
+            time.sleep(BACKOFF)
+
+    def run(self):
+        kinds = self.desired.kinds
+        logger.info("Watching %s", ", ".join(kind for _, kind in kinds))
+        with ThreadPoolExecutor(max_workers=len(kinds)) as pool:
+            list(pool.map(self.watch, kinds))
+
+
+def main(path):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    # applies as the charm does, so neither takes fields from the other
+    Watcher(Desired(path), Client(field_manager=FIELD_MANAGER)).run()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1])
@@ -0,0 +1,9 @@
+from tests.fixtures import (  # noqa: F401
+    endpoint_probe,
+    fake_kube,
+    kube_latency,
+    lightkube_client,
+    make_charm,
+    manifest_cache,
+    manifests,
+)
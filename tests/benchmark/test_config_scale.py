@@ -0,0 +1,41 @@
+import json
+import time
+
+import pytest
+
+from config.scale import ConfigScale
+
+GROUPS = 10_000
+MODEL = "cdcaed9f-336d-47d3-83ba-d9ea9047b18c"
+
+
+def _groups(count):
+    for i in range(count):
+        group = {"min": 1, "max": i % 50 + 2, "application": f"worker-{i}"}
+        if i % 2:
+            group["model"] = MODEL
+        yield group
+
+
+def _yaml(groups):
+    return "\n".join(f"- {json.dumps(group)}" for group in groups)
+
+
+@pytest.mark.parametrize("fmt, dump", [("json", json.dumps), ("yaml", _yaml)])
+def test_parse_and_render_10k_node_groups(fmt, dump):
+    cfg = dump(list(_groups(GROUPS)))
+
+    start = time.perf_counter()
+    scale = ConfigScale(cfg)
+    parsed = time.perf_counter()
+    nodes = scale.nodes("default-model")
+    rendered = time.perf_counter()
+    scale.nodes("default-model")
+    memoized = time.perf_counter()
+
+    print(
+        f"\n{GROUPS} node groups ({fmt}): parse={(parsed - start) * 1e3:.1f}ms"
+        f" render={(rendered - parsed) * 1e3:.1f}ms"
+        f" memoized={(memoized - rendered) * 1e6:.1f}us"
+    )
+    assert len(nodes) == GROUPS
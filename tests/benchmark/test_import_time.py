@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+ROUNDS = 5
+# Import time charm.py may add on top of the ops framework it always needs
+BUDGET_MS = 50
+OPS = "import ops.charm, ops.framework, ops.main, ops.model"
+
+
+def _import_ms(statement):
+    script = (
+        "import time; start = time.perf_counter(); "
+        f"{statement}; print((time.perf_counter() - start) * 1e3)"
+    )
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(["src", os.environ.get("PYTHONPATH", "")])}
+    runs = [
+        float(subprocess.check_output([sys.executable, "-c", script], env=env))
+        for _ in range(ROUNDS)
+    ]
+    return min(runs)
+
+
+def test_charm_import_budget():
+    ops_ms, charm_ms = _import_ms(OPS), _import_ms(f"{OPS}; import charm")
+    print(f"\nimport time: ops={ops_ms:.1f}ms charm={charm_ms - ops_ms:.1f}ms")
+    assert charm_ms - ops_ms < BUDGET_MS
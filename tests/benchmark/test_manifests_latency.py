@@ -0,0 +1,22 @@
+import time
+
+import pytest
+
+LATENCY = 0.05
+# Round trips a full apply or teardown may cost against a slow api server
+BUDGET_ROUND_TRIPS = 3
+
+
+@pytest.fixture
+def kube_latency():
+    return LATENCY
+
+
+@pytest.mark.parametrize("action", ["apply_manifests", "delete_manifest"])
+def test_manifests_against_slow_api_server(manifests, action):
+    manifests.apply_manifests()
+    start = time.perf_counter()
+    getattr(manifests, action)()
+    elapsed = time.perf_counter() - start
+    print(f"\n{action} with {LATENCY * 1e3:.0f}ms api latency: {elapsed * 1e3:.0f}ms")
+    assert elapsed < BUDGET_ROUND_TRIPS * LATENCY
@@ -0,0 +1,123 @@
+import base64
+from collections import defaultdict
+import json
+import os
+from pathlib import Path
+import time
+
+import pytest
+from ops.testing import Harness
+
+from charm import KubernetesAutoscalerCharm
+
+REPORT = Path(os.environ.get("BENCHMARK_REPORT", "benchmark-report.json"))
+STORM = 10
+# Per-event budgets, any measurement above these fails the benchmark. Install and
+# upgrade apply 6 manifests, get then patch the StatefulSet's resources, and audit
+# the inventory with a list of each of the 9 kinds which could be managed
+BUDGETS = {
+    "install": {"wall_ms": 250, "kube_calls": 17, "pebble_calls": 5, "pushed_bytes": 4096},
+    "config_changed": {"wall_ms": 50, "kube_calls": 0, "pebble_calls": 3, "pushed_bytes": 0},
+    "upgrade_charm": {"wall_ms": 50, "kube_calls": 17, "pebble_calls": 2, "pushed_bytes": 0},
+    "stop": {"wall_ms": 250, "kube_calls": 6, "pebble_calls": 3, "pushed_bytes": 0},
+}
+KUBE_METHODS = ("apply", "create", "delete", "get", "list", "patch", "replace", "watch")
+
+
+class Recorder:
+    """Count pebble calls, pushed bytes and kubernetes api calls per event type."""
+
+    def __init__(self, container, lightkube_client):
+        self._kube = lightkube_client
+        self.pebble_calls = 0
+        self.pushed_bytes = 0
+        self.samples = defaultdict(list)
+        client = container.pebble
+        for name in dir(client):
+            if not name.startswith("_") and callable(getattr(client, name)):
+                setattr(client, name, self._counted(getattr(client, name)))
+
+    def _counted(self, method):
+        def wrapper(*args, **kwargs):
+            self.pebble_calls += 1
+            if method.__name__ == "push":
+                source = args[1]
+                self.pushed_bytes += len(source if isinstance(source, bytes) else source.encode())
+            return method(*args, **kwargs)
+
+        return wrapper
+
+    @property
+    def kube_calls(self):
+        return sum(getattr(self._kube, name).call_count for name in KUBE_METHODS)
+
+    def measure(self, event, emit):
+        kube, pebble, pushed = self.kube_calls, self.pebble_calls, self.pushed_bytes
+        start = time.perf_counter()
+        emit()
+        sample = {
+            "wall_ms": (time.perf_counter() - start) * 1e3,
+            "kube_calls": self.kube_calls - kube,
+            "pebble_calls": self.pebble_calls - pebble,
+            "pushed_bytes": self.pushed_bytes - pushed,
+        }
+        self.samples[event].append(sample)
+
+    def report(self):
+        return {
+            event: {
+                "events": len(samples),
+                "mean": {key: sum(s[key] for s in samples) / len(samples) for key in samples[0]},
+                "max": {key: max(s[key] for s in samples) for key in samples[0]},
+            }
+            for event, samples in self.samples.items()
+        }
+
+
+@pytest.fixture
+def harness(manifest_cache):
+    ca_cert = Path("tests/data/pebble_cfg_minimum/test_ca.cert").read_bytes()
+    harness = Harness(KubernetesAutoscalerCharm)
+    harness.set_model_name("benchmark")
+    harness.update_config(
+        {
+            "juju_api_endpoints": "1.2.3.4:17070",
+            "juju_username": "alice",
+            "juju_password": "secret",
+            "juju_default_model_uuid": "cdcaed9f-336d-47d3-83ba-d9ea9047b18c",
+            "juju_scale": "- {min: 1, max: 3, application: kubernetes-worker}",
+            "juju_ca_cert": base64.b64encode(ca_cert).decode("ascii"),
+        }
+    )
+    harness.set_leader(True)
+    harness.begin()
+    harness.model.unit.get_container("juju-autoscaler").push("/cluster-autoscaler", "#!/bin/sh")
+    yield harness
+    harness.cleanup()
+
+
+def test_reconcile_budgets(harness, lightkube_client):
+    charm = harness.charm
+    recorder = Recorder(harness.model.unit.get_container("juju-autoscaler"), lightkube_client)
+
+    recorder.measure("install", charm.on.install.emit)
+    for i in range(STORM):
+        # every other event repeats the previous configuration
+        config = {"autoscaler_extra_args": f"{{v: {i // 2}}}"}
+        recorder.measure("config_changed", lambda: harness.update_config(config))
+    recorder.measure("upgrade_charm", charm.on.upgrade_charm.emit)
+    # the last unit leaving tears the manifests down
+    harness.set_planned_units(0)
+    recorder.measure("stop", charm.on.stop.emit)
+
+    report = recorder.report()
+    REPORT.write_text(json.dumps({"budgets": BUDGETS, "events": report}, indent=2))
+    print(f"\nreconcile report written to {REPORT}")
+
+    exceeded = [
+        f"{event}.{key}={report[event]['max'][key]:.1f} > {budget}"
+        for event, budgets in BUDGETS.items()
+        for key, budget in budgets.items()
+        if report[event]["max"][key] > budget
+    ]
+    assert not exceeded, f"reconcile budgets exceeded: {', '.join(exceeded)}"
@@ -0,0 +1,232 @@
+"""In-process stand-in for the handful of Kubernetes API endpoints the charm uses.
+
+Supports create, get, list, replace, patch (including server-side apply) and
+delete for any kind, with configurable latency, fault injection and request
+counting, so Manifests and the charm can be exercised without a cluster.
+"""
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+import uuid
+
+from lightkube import Client, KubeConfig
+
+from manifests import FIELD_MANAGER
+
+
+def _status(code, reason, message):
+    return {
+        "kind": "Status",
+        "apiVersion": "v1",
+        "metadata": {},
+        "status": "Success" if code < 400 else "Failure",
+        "message": message,
+        "reason": reason,
+        "code": code,
+    }
+
+
+def _merge(base, patch):
+    """Recursive merge, close enough to merge, strategic and apply patches for testing."""
+    merged = dict(base)
+    for key, value in patch.items():
+        if value is None:
+            merged.pop(key, None)
+        elif isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _selected(obj, selector):
+    labels = obj.get("metadata", {}).get("labels") or {}
+    for term in filter(None, selector.split(",")):
+        if "!=" in term:
+            key, value = term.split("!=", 1)
+            if labels.get(key) == value:
+                return False
+        elif "=" in term:
+            key, value = term.split("=", 1)
+            if labels.get(key) != value.lstrip("="):
+                return False
+        elif term not in labels:
+            return False
+    return True
+
+
+class Fault:
+    def __init__(self, code, count, method, retry_after):
+        self.code, self.count, self.method, self.retry_after = code, count, method, retry_after
+
+
+class FakeKube:
+    """A fake api server; use as a context manager to run it on a local port."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.objects = {}
+        self.requests = Counter()
+        self._faults = []
+        self._resource_version = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+        )
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def client(self, namespace="default", **kwargs):
+        config = KubeConfig.from_dict(
+            {
+                "clusters": [{"name": "fake", "cluster": {"server": self.url}}],
+                "users": [{"name": "fake", "user": {}}],
+                "contexts": [
+                    {
+                        "name": "fake",
+                        "context": {"cluster": "fake", "user": "fake", "namespace": namespace},
+                    }
+                ],
+                "current-context": "fake",
+            }
+        )
+        # Construct explicitly, patching and restoring Client.__new__ (as the unit
+        # tests' conftest does) leaves Client() rejecting constructor arguments
+        client = object.__new__(Client)
+        client.__init__(config=config, trust_env=False, field_manager=FIELD_MANAGER, **kwargs)
+        return client
+
+    def inject(self, code, count=1, method=None, retry_after=None):
+        """Fail the next count requests (optionally only of one http method) with code."""
+        with self._lock:
+            self._faults.append(Fault(code, count, method, retry_after))
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _take_fault(self, method):
+        with self._lock:
+            for fault in self._faults:
+                if fault.method in (None, method):
+                    fault.count -= 1
+                    if fault.count <= 0:
+                        self._faults.remove(fault)
+                    return fault
+        return None
+
+    def _next_version(self):
+        self._resource_version += 1
+        return str(self._resource_version)
+
+    def handle(self, method, path, query, body, content_type=""):
+        """Serve one request, returning (code, body, headers)."""
+        parts = [p for p in path.split("/") if p]
+        prefix, parts = (parts[:2], parts[2:]) if parts[0] == "api" else (parts[:3], parts[3:])
+        namespace = None
+        if parts[:1] == ["namespaces"] and len(parts) > 2:
+            namespace, parts = parts[1], parts[2:]
+        plural, name = parts[0], (parts[1] if len(parts) > 1 else None)
+        self.requests[(method, plural)] += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+        fault = self._take_fault(method)
+        if fault:
+            headers = {"Retry-After": str(fault.retry_after)} if fault.retry_after else {}
+            return fault.code, _status(fault.code, "Injected", "injected fault"), headers
+
+        group_version = "/".join(prefix[1:])
+        key = (group_version, plural, namespace, name)
+        with self._lock:
+            if method == "GET" and name is None:
+                return 200, self._list(group_version, plural, namespace, query), {}
+            elif method == "GET":
+                if key not in self.objects:
+                    return 404, _status(404, "NotFound", f'{plural} "{name}" not found'), {}
+                return 200, self.objects[key], {}
+            elif method == "POST":
+                name = body["metadata"]["name"]
+                key = (group_version, plural, namespace, name)
+                if key in self.objects:
+                    return 409, _status(409, "AlreadyExists", f'{plural} "{name}" exists'), {}
+                return 201, self._store(key, body), {}
+            elif method == "PUT":
+                return 200, self._store(key, body), {}
+            elif method == "PATCH":
+                current = self.objects.get(key)
+                if current is None and "apply-patch" not in content_type:
+                    return 404, _status(404, "NotFound", f'{plural} "{name}" not found'), {}
+                return 200, self._store(key, _merge(current or {}, body)), {}
+            elif method == "DELETE":
+                if self.objects.pop(key, None) is None:
+                    return 404, _status(404, "NotFound", f'{plural} "{name}" not found'), {}
+                return 200, _status(200, "", ""), {}
+        return 405, _status(405, "MethodNotAllowed", method), {}
+
+    def _store(self, key, obj):
+        metadata = obj.setdefault("metadata", {})
+        metadata.setdefault("uid", str(uuid.uuid4()))
+        if key[2]:
+            metadata["namespace"] = key[2]
+        metadata["resourceVersion"] = self._next_version()
+        self.objects[key] = obj
+        return obj
+
+    def _list(self, group_version, plural, namespace, query):
+        selector = query.get("labelSelector", "")
+        items = [
+            obj
+            for (gv, kind, ns, _), obj in sorted(self.objects.items())
+            if (gv, kind) == (group_version, plural)
+            and namespace in (None, ns)
+            and _selected(obj, selector)
+        ]
+        return {
+            "apiVersion": group_version,
+            "kind": "List",
+            "metadata": {"resourceVersion": str(self._resource_version)},
+            "items": items,
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _serve(self):
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                content_type = self.headers.get("Content-Type", "")
+                code, response, headers = fake.handle(
+                    self.command, url.path, query, body, content_type
+                )
+                payload = json.dumps(response).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for header, value in headers.items():
+                    self.send_header(header, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _serve
+
+            def log_message(self, *_):
+                pass
+
+        return Handler
@@ -0,0 +1,64 @@
+"""Fixtures shared by the unit tests and benchmarks, imported by each conftest."""
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import lightkube
+import pytest
+
+from manifests import Manifests
+from throttle import Retry, TokenBucket
+from tests.fake_kube import FakeKube
+
+
+@pytest.fixture(autouse=True)
+def lightkube_client(request):
+    # Prevent any test from actually invoking any lightkube api, unless it talks
+    # to the fake api server instead
+    if "fake_kube" in request.fixturenames:
+        yield None
+        return
+    client = MagicMock()
+    with patch.object(lightkube.Client, "__new__", return_value=client):
+        yield client
+
+
+@pytest.fixture(autouse=True)
+def manifest_cache(tmp_path):
+    # Keep compiled manifests out of the source tree
+    with patch.object(Manifests, "cache_dir", tmp_path / "manifest-cache"):
+        yield Manifests.cache_dir
+
+
+@pytest.fixture(autouse=True)
+def endpoint_probe():
+    # Every configured juju api endpoint answers immediately
+    with patch("probe.create_connection") as create_connection:
+        yield create_connection
+
+
+@pytest.fixture
+def make_charm():
+    # Stand-in for the charm, carrying only the model and application Manifests reads
+    def make_charm(model="test-model", app="test-app"):
+        return SimpleNamespace(model=SimpleNamespace(name=model, app=SimpleNamespace(name=app)))
+
+    return make_charm
+
+
+@pytest.fixture
+def kube_latency():
+    return 0.0
+
+
+@pytest.fixture
+def fake_kube(kube_latency):
+    with FakeKube(latency=kube_latency) as fake_kube:
+        yield fake_kube
+
+
+@pytest.fixture
+def manifests(fake_kube, make_charm):
+    manifests = Manifests(make_charm(), client=fake_kube.client(namespace="test-model"))
+    manifests.retry = Retry(TokenBucket(rate=1000, burst=100), base=0.01)
+    return manifests
@@ -2,7 +2,11 @@
 # See LICENSE file for licensing details.
 #
 import base64
+from datetime import datetime, timezone
+import os
 from pathlib import Path
+import subprocess
+import sys
 from unittest.mock import patch, MagicMock
 
 import pytest
@@ -10,13 +14,22 @@ import yaml
 
 
 from charm import KubernetesAutoscalerCharm
-from ops.model import ActiveStatus, BlockedStatus, ModelError
+from config.scale import ConfigScale
+from ops.model import ActiveStatus, BlockedStatus, MaintenanceStatus, ModelError, WaitingStatus
+from ops.pebble import CheckInfo, CheckLevel, CheckStatus
 from ops.testing import Harness
 
 
+def test_trivial_hooks_skip_heavy_imports():
+    script = "import sys, charm; print(sorted({'lightkube', 'manifests'} & set(sys.modules)))"
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(["src", os.environ.get("PYTHONPATH", "")])}
+    assert subprocess.check_output([sys.executable, "-c", script], env=env) == b"[]\n"
+
+
 @pytest.fixture(scope="function")
 def harness(request):
     harness = Harness(KubernetesAutoscalerCharm)
+    harness.set_leader(True)
     harness.begin()
     harness._backend.model_name = request.node.originalname
     yield harness
@@ -99,28 +112,32 @@ def mock_pebble_exec(harness):
     container.pebble.exec = prior_exec
 
 
+@pytest.fixture
+def minimal_config():
+    testdata = Path("tests/data/pebble_cfg_minimum/")
+    text = Path(testdata, "test_ca.cert").read_text().encode("ascii")
+    text = base64.b64encode(text).decode("ascii")
+    return {
+        "juju_api_endpoints": "1.2.3.4:17070",
+        "juju_username": "alice",
+        "juju_password": "secret",
+        "juju_default_model_uuid": "cdcaed9f-336d-47d3-83ba-d9ea9047b18c",
+        "juju_scale": "- {min: 1, max: 3, application: kubernetes-worker}",
+        "juju_ca_cert": text,
+        "autoscaler_extra_args": "{v: 5, scale-down-unneeded-time: 5m0s}",
+    }
+
+
 def test_juju_autoscaler_pebble_ready_after_config_minimal(
-    lightkube_client, mock_pebble_exec, harness
+    lightkube_client, mock_pebble_exec, minimal_config, harness
 ):
     container, pebble_exec = mock_pebble_exec
     pebble_exec.return_value = b"", b""
 
     testdata = Path("tests/data/pebble_cfg_minimum/")
     container.push("/cluster-autoscaler", "#!/bin/sh")
-    text = Path(testdata, "test_ca.cert").read_text().encode("ascii")
-    text = base64.b64encode(text).decode("ascii")
     with patch("uuid.uuid4", return_value="511730b6-55a4-4a9e-84d7-80e46896a2d1"):
-        harness.update_config(
-            {
-                "juju_api_endpoints": "1.2.3.4:17070",
-                "juju_username": "alice",
-                "juju_password": "secret",
-                "juju_default_model_uuid": "cdcaed9f-336d-47d3-83ba-d9ea9047b18c",
-                "juju_scale": "- {min: 1, max: 3, application: kubernetes-worker}",
-                "juju_ca_cert": text,
-                "autoscaler_extra_args": "{v: 5, scale-down-unneeded-time: 5m0s}",
-            }
-        )
+        harness.update_config(minimal_config)
     assert harness.model.unit.status == ActiveStatus()
 
     plan = harness.get_container_pebble_plan("juju-autoscaler")
@@ -133,8 +150,440 @@ def test_juju_autoscaler_pebble_ready_after_config_minimal(
     contents = yaml.safe_load(Path(testdata, "cloud-config.yaml").read_text())
     assert yaml.safe_load(container.pull(f"{config_path}/cloud-config.yaml").read()) == contents
 
-    lightkube_client.delete.assert_called()
-    lightkube_client.create.assert_called()
+    lightkube_client.apply.assert_called()
+    lightkube_client.delete.assert_not_called()
+    lightkube_client.create.assert_not_called()
+
+
+def test_juju_autoscaler_restart_only_when_changed(minimal_config, harness):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push("/cluster-autoscaler", "#!/bin/sh")
+    with patch.object(type(container), "restart", autospec=True) as mock_restart:
+        harness.update_config(minimal_config)
+        assert mock_restart.call_count == 1
+        assert harness.model.unit.status == ActiveStatus()
+
+        # autostart brought the service up, replay hooks that change nothing
+        harness.charm.on.config_changed.emit()
+        harness.charm.on.juju_autoscaler_pebble_ready.emit(container)
+        assert mock_restart.call_count == 1
+        assert harness.model.unit.status == ActiveStatus()
+
+        harness.update_config({"autoscaler_extra_args": "{v: 3}"})
+        assert mock_restart.call_count == 2
+
+
+def test_config_change_reconciles_only_affected_parts(lightkube_client, minimal_config, harness):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push("/cluster-autoscaler", "#!/bin/sh")
+    harness.update_config(minimal_config)
+    lightkube_client.apply.assert_called()
+    lightkube_client.apply.reset_mock()
+
+    pebble = container.pebble
+    with patch.object(pebble, "push", wraps=pebble.push) as push, patch.object(
+        pebble, "add_layer", wraps=pebble.add_layer
+    ) as add_layer:
+        harness.update_config({"juju_password": "rotated"})
+        push.assert_called_once()
+        add_layer.assert_not_called()
+
+        harness.update_config({"autoscaler_extra_args": "{v: 1}"})
+        push.assert_called_once()
+        add_layer.assert_called_once()
+
+    lightkube_client.apply.assert_not_called()
+    assert list(harness.charm._stored.pending) == []
+    assert harness.model.unit.status == ActiveStatus()
+
+
+@patch("charm.time")
+def test_config_burst_reconciled_once_per_window(
+    mock_time, lightkube_client, minimal_config, harness
+):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push("/cluster-autoscaler", "#!/bin/sh")
+    mock_time.time.return_value = 1000.0
+    harness.update_config({**minimal_config, "autoscaler_reconcile_window": 30})
+    assert harness.model.unit.status == ActiveStatus()
+    lightkube_client.apply.reset_mock()
+
+    pebble = container.pebble
+    with patch.object(pebble, "add_layer", wraps=pebble.add_layer) as add_layer:
+        for verbosity in range(1, 5):
+            mock_time.time.return_value = 1000.0 + verbosity
+            harness.update_config({"autoscaler_extra_args": f"{{v: {verbosity}}}"})
+        harness.update_config({"autoscaler_headroom": "kubernetes-worker: {replicas: 1, cpu: 1}"})
+        assert harness.model.unit.status == WaitingStatus("Reconciling within 26s")
+        add_layer.assert_not_called()
+        lightkube_client.apply.assert_not_called()
+        assert len(list(harness.framework._storage.notices())) == 1
+
+        mock_time.time.return_value = 1030.0
+        harness.framework.reemit()
+        add_layer.assert_called_once()
+
+    assert lightkube_client.apply.called
+    plan = harness.get_container_pebble_plan("juju-autoscaler").to_dict()
+    assert "--v='4'" in plan["services"]["juju-autoscaler"]["command"]
+    assert list(harness.charm._stored.pending) == []
+    assert harness.model.unit.status == ActiveStatus()
+    assert not list(harness.framework._storage.notices())
+
+
+def test_pending_parts_survive_failed_reconcile(minimal_config, harness):
+    harness.update_config({**minimal_config, "juju_password": ""})
+    assert harness.model.unit.status.message.startswith("Waiting for Juju Configuration")
+    assert list(harness.charm._stored.pending) == [
+        "cloud-config",
+        "manifests",
+        "resources",
+    ]
+
+
+def test_args_file_keeps_command_constant(minimal_config, harness):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push("/cluster-autoscaler", "#!/bin/sh")
+    harness.update_config({**minimal_config, "autoscaler_args_file": True})
+    assert harness.model.unit.status == BlockedStatus("Image missing executable: /bin/sh")
+
+    container.push("/bin/sh", "", make_dirs=True)
+    harness.charm.on.config_changed.emit()
+    assert harness.model.unit.status == ActiveStatus()
+    plan = harness.get_container_pebble_plan("juju-autoscaler").to_dict()
+    command = plan["services"]["juju-autoscaler"]["command"]
+    assert command.startswith("/bin/sh -c ")
+    assert "--nodes" not in command
+    args = container.pull("/config/autoscaler-args").read().splitlines()
+    assert args == [
+        "--namespace=test_args_file_keeps_command_constant",
+        "--cloud-provider=juju",
+        "--cloud-config=/config/cloud-config.yaml",
+        "--nodes=1:3:cdcaed9f-336d-47d3-83ba-d9ea9047b18c:kubernetes-worker",
+        "--leader-elect-lease-duration=10s",
+        "--leader-elect-renew-deadline=7s",
+        "--leader-elect-resource-lock=leases",
+        "--leader-elect-resource-name=kubernetes-autoscaler",
+        "--leader-elect-retry-period=2s",
+        "--leader-elect=true",
+        "--scale-down-unneeded-time=5m0s",
+        "--v=5",
+    ]
+
+    pebble = container.pebble
+    with patch.object(pebble, "add_layer", wraps=pebble.add_layer) as add_layer:
+        harness.update_config({"juju_scale": "- {min: 1, max: 9, application: kubernetes-worker}"})
+        add_layer.assert_not_called()
+    args = container.pull("/config/autoscaler-args").read().splitlines()
+    assert "--nodes=1:9:cdcaed9f-336d-47d3-83ba-d9ea9047b18c:kubernetes-worker" in args
+    assert harness.get_container_pebble_plan("juju-autoscaler").to_dict() == plan
+
+
+def test_profile_merges_beneath_extra_args(minimal_config, harness):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push("/cluster-autoscaler", "#!/bin/sh")
+    config = {**minimal_config, "autoscaler_profile": "cost-saver"}
+    harness.update_config(config)
+    service = harness.get_container_pebble_plan("juju-autoscaler").services["juju-autoscaler"]
+    assert "--scale-down-delay-after-add='5m'" in service.command
+    assert "--scale-down-unneeded-time='5m0s'" in service.command
+    assert "--scale-down-unneeded-time='5m'" not in service.command
+
+    harness.update_config({"autoscaler_profile": "turbo"})
+    assert harness.model.unit.status == BlockedStatus(
+        "autoscaler_profile invalid: 'turbo' is not one of"
+        " low-latency, balanced, cost-saver, large-cluster"
+    )
+
+
+def test_endpoints_ranked_by_latency(endpoint_probe, minimal_config, harness):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push("/cluster-autoscaler", "#!/bin/sh")
+    endpoints = "1.2.3.4:17070, 1.2.3.5:17070"
+    endpoint_probe.side_effect = lambda address, timeout: _refuse(address, "1.2.3.4")
+    harness.update_config({**minimal_config, "juju_api_endpoints": endpoints})
+    cloud_config = yaml.safe_load(container.pull("/config/cloud-config.yaml").read())
+    assert cloud_config["endpoints"] == ["1.2.3.5:17070", "1.2.3.4:17070"]
+    assert harness.model.unit.status == ActiveStatus()
+
+    # only changes to the cloud-config probe again, keeping the previous order
+    endpoint_probe.reset_mock()
+    harness.update_config({"autoscaler_extra_args": "{v: 3}"})
+    endpoint_probe.assert_not_called()
+    cloud_config = yaml.safe_load(container.pull("/config/cloud-config.yaml").read())
+    assert cloud_config["endpoints"] == ["1.2.3.5:17070", "1.2.3.4:17070"]
+
+    endpoint_probe.side_effect = OSError("unreachable")
+    harness.update_config({"juju_password": "changed"})
+    assert harness.model.unit.status == ActiveStatus("No Juju API endpoint is reachable")
+
+
+def test_controller_addresses_pushed_without_option_change(minimal_config, harness):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push("/cluster-autoscaler", "#!/bin/sh")
+    config = {**minimal_config, "juju_api_endpoints": ""}
+    with patch.dict(os.environ, {"JUJU_API_ADDRESSES": "1.2.3.4:17070"}):
+        harness.update_config(config)
+    cloud_config = yaml.safe_load(container.pull("/config/cloud-config.yaml").read())
+    assert cloud_config["endpoints"] == ["1.2.3.4:17070"]
+
+    # the controller moved, but no option changed
+    with patch.dict(os.environ, {"JUJU_API_ADDRESSES": "1.2.3.6:17070"}):
+        harness.charm.on.config_changed.emit()
+    cloud_config = yaml.safe_load(container.pull("/config/cloud-config.yaml").read())
+    assert cloud_config["endpoints"] == ["1.2.3.6:17070"]
+    assert harness.model.unit.status == ActiveStatus()
+
+
+def _refuse(address, host):
+    if address[0] == host:
+        raise ConnectionRefusedError(address)
+    return MagicMock()
+
+
+def test_headroom_applied_then_pruned(lightkube_client, minimal_config, harness):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push("/cluster-autoscaler", "#!/bin/sh")
+    headroom = "kubernetes-worker: {replicas: 2, cpu: 500m}"
+    harness.update_config({**minimal_config, "autoscaler_headroom": headroom})
+    applied = {args[0].kind for args, _ in lightkube_client.apply.call_args_list}
+    assert {"PriorityClass", "Deployment"} <= applied
+    lightkube_client.delete.assert_not_called()
+
+    lightkube_client.apply.reset_mock()
+    harness.update_config({"autoscaler_headroom": ""})
+    deleted = {args[0].__name__ for args, _ in lightkube_client.delete.call_args_list}
+    assert deleted == {"PriorityClass", "Deployment"}
+    assert lightkube_client.apply.call_count == 6
+
+
+def test_leader_without_history_prunes_headroom(lightkube_client, minimal_config, harness):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push("/cluster-autoscaler", "#!/bin/sh")
+    headroom = "kubernetes-worker: {replicas: 2, cpu: 500m}"
+    harness.update_config({**minimal_config, "autoscaler_headroom": headroom})
+    live = [args[0] for args, _ in lightkube_client.apply.call_args_list]
+    lightkube_client.list.side_effect = lambda resource_type, **_: [
+        obj for obj in live if isinstance(obj, resource_type)
+    ]
+
+    # such as a unit upgraded from a revision which never recorded what it applied
+    lightkube_client.list.reset_mock()
+    harness.charm._stored.applied = []
+    harness.update_config({"autoscaler_headroom": ""})
+    deleted = {args[0].__name__ for args, _ in lightkube_client.delete.call_args_list}
+    assert deleted == {"PriorityClass", "Deployment"}
+    assert lightkube_client.list.call_count == 9
+
+    # audited, so the next change lists nothing unless the set changes
+    lightkube_client.list.reset_mock()
+    harness.update_config({"autoscaler_extra_args": "{v: 1}"})
+    lightkube_client.list.assert_not_called()
+
+
+def test_node_templates_in_cloud_config(minimal_config, harness):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push("/cluster-autoscaler", "#!/bin/sh")
+    scale = (
+        "- {min: 1, max: 3, application: kubernetes-worker}\n"
+        "- {min: 0, max: 2, application: kubernetes-worker-gpu, template: {cpu: 8, memory: 64Gi}}"
+    )
+    harness.update_config({**minimal_config, "juju_scale": scale})
+    assert harness.model.unit.status == ActiveStatus()
+    cloud_config = yaml.safe_load(container.pull("/config/cloud-config.yaml").read())
+    model = minimal_config["juju_default_model_uuid"]
+    assert cloud_config["node-templates"] == {
+        f"{model}:kubernetes-worker-gpu": {
+            "cpu": "8",
+            "memory": "64Gi",
+            "gpu": 0,
+            "labels": {},
+            "taints": [],
+        }
+    }
+
+
+def test_node_templates_from_cached_parse(minimal_config, harness):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push("/cluster-autoscaler", "#!/bin/sh")
+    template = "{cpu: 8, memory: 64Gi, labels: {gpu: a100}, taints: [gpu:NoSchedule]}"
+    scale = f"- {{min: 0, max: 2, application: kubernetes-worker-gpu, template: {template}}}"
+    harness.update_config({**minimal_config, "juju_scale": scale})
+    model = minimal_config["juju_default_model_uuid"]
+
+    # as every hook after the first does, rebuild the parse from StoredState
+    parsed = harness.charm._stored.juju_config_parsed["scale"]["data"]
+    rebuilt = ConfigScale(scale, cached=parsed)
+    assert yaml.safe_load(yaml.safe_dump(rebuilt.templates(model))) == {
+        f"{model}:kubernetes-worker-gpu": {
+            "cpu": "8",
+            "memory": "64Gi",
+            "gpu": 0,
+            "labels": {"gpu": "a100"},
+            "taints": [{"key": "gpu", "value": "", "effect": "NoSchedule"}],
+        }
+    }
+
+    model = "0b1d3c55-4f0e-4a47-9d0b-5d2a4f5b8e21"
+    harness.update_config({"juju_default_model_uuid": model})
+    cloud_config = yaml.safe_load(container.pull("/config/cloud-config.yaml").read())
+    assert list(cloud_config["node-templates"]) == [f"{model}:kubernetes-worker-gpu"]
+
+    harness.charm._juju_config._cached.clear()
+    harness.charm.on.upgrade_charm.emit()
+    assert harness.model.unit.status == ActiveStatus()
+    cloud_config = yaml.safe_load(container.pull("/config/cloud-config.yaml").read())
+    assert cloud_config["node-templates"][f"{model}:kubernetes-worker-gpu"]["labels"] == {
+        "gpu": "a100"
+    }
+
+
+def test_priority_expander(lightkube_client, minimal_config, harness):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push("/cluster-autoscaler", "#!/bin/sh")
+    scale = (
+        "- {min: 1, max: 3, application: kubernetes-worker, priority: 20}\n"
+        "- {min: 1, max: 3, application: kubernetes-worker-slow, priority: 10}"
+    )
+    harness.update_config({**minimal_config, "juju_scale": scale})
+    service = harness.get_container_pebble_plan("juju-autoscaler").services["juju-autoscaler"]
+    assert "--expander='priority'" in service.command
+    applied = {args[0].kind: args[0] for args, _ in lightkube_client.apply.call_args_list}
+    config_map = applied["ConfigMap"]
+    assert config_map.metadata.name == "cluster-autoscaler-priority-expander"
+    model = minimal_config["juju_default_model_uuid"]
+    assert yaml.safe_load(config_map.data["priorities"]) == {
+        20: [f"^({model}[:/])?kubernetes-worker$"],
+        10: [f"^({model}[:/])?kubernetes-worker-slow$"],
+    }
+
+    # node group keys are qualified by the default model, so follow it
+    lightkube_client.apply.reset_mock()
+    model = "0b1d3c55-4f0e-4a47-9d0b-5d2a4f5b8e21"
+    harness.update_config({"juju_default_model_uuid": model})
+    applied = {args[0].kind: args[0] for args, _ in lightkube_client.apply.call_args_list}
+    assert yaml.safe_load(applied["ConfigMap"].data["priorities"])[20] == [
+        f"^({model}[:/])?kubernetes-worker$"
+    ]
+
+    harness.update_config({"autoscaler_extra_args": "{expander: least-waste}"})
+    service = harness.get_container_pebble_plan("juju-autoscaler").services["juju-autoscaler"]
+    assert "--expander='least-waste'" in service.command
+    assert "--expander='priority'" not in service.command
+
+
+def test_update_status_applies_scheduled_bounds(lightkube_client, minimal_config, harness):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push("/cluster-autoscaler", "#!/bin/sh")
+    scale = (
+        "- {min: 1, max: 3, application: kubernetes-worker,"
+        " schedule: [{cron: '0 8 * * *', duration: 10h, min: 5, max: 10}]}"
+    )
+    model = minimal_config["juju_default_model_uuid"]
+    morning = datetime(2024, 1, 1, 7, tzinfo=timezone.utc)
+    get_checks = patch("ops.model.Container.get_checks", return_value={})
+    with get_checks, patch("config.schedule.now", return_value=morning):
+        harness.update_config({**minimal_config, "juju_scale": scale})
+        harness.charm.on.update_status.emit()
+    service = harness.get_container_pebble_plan("juju-autoscaler").services["juju-autoscaler"]
+    assert f"--nodes 1:3:{model}:kubernetes-worker" in service.command
+    assert "--enforce-node-group-min-size='true'" in service.command
+
+    lightkube_client.reset_mock()
+    with get_checks, patch("config.schedule.now", return_value=morning.replace(hour=8)):
+        harness.charm.on.update_status.emit()
+    service = harness.get_container_pebble_plan("juju-autoscaler").services["juju-autoscaler"]
+    assert f"--nodes 5:10:{model}:kubernetes-worker" in service.command
+    assert harness.model.unit.status == ActiveStatus()
+    # only the command is reconciled
+    lightkube_client.apply.assert_not_called()
+
+
+def test_health_check_restarts_autoscaler(minimal_config, harness):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push("/cluster-autoscaler", "#!/bin/sh")
+    pebble = container.pebble
+    with patch.object(pebble, "add_layer", wraps=pebble.add_layer) as add_layer:
+        harness.update_config({**minimal_config, "autoscaler_extra_args": "{address: ':9090'}"})
+    layer = add_layer.call_args[0][1]
+    service = layer["services"]["juju-autoscaler"]
+    assert service["on-check-failure"] == {"juju-autoscaler-health": "restart"}
+    check = layer["checks"]["juju-autoscaler-health"]
+    assert check["level"] == "alive"
+    assert check["http"] == {"url": "http://localhost:9090/health-check"}
+
+
+@pytest.mark.parametrize(
+    "checks, status",
+    [
+        ([CheckInfo("juju-autoscaler-health", CheckLevel.ALIVE, CheckStatus.UP)], ActiveStatus()),
+        (
+            [
+                CheckInfo(
+                    "juju-autoscaler-health",
+                    CheckLevel.ALIVE,
+                    CheckStatus.UP,
+                    failures=1,
+                    threshold=3,
+                )
+            ],
+            ActiveStatus("Health check failing: juju-autoscaler-health (1/3)"),
+        ),
+        (
+            [
+                CheckInfo(
+                    "juju-autoscaler-health",
+                    CheckLevel.ALIVE,
+                    CheckStatus.DOWN,
+                    failures=3,
+                    threshold=3,
+                )
+            ],
+            MaintenanceStatus("Restarting, health check down: juju-autoscaler-health"),
+        ),
+    ],
+)
+def test_update_status_surfaces_health_check(minimal_config, harness, checks, status):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push("/cluster-autoscaler", "#!/bin/sh")
+    harness.update_config(minimal_config)
+    with patch("ops.model.Container.get_checks", autospec=True) as get_checks:
+        get_checks.return_value = {check.name: check for check in checks}
+        harness.charm.on.update_status.emit()
+    assert harness.model.unit.status == status
+
+
+def test_update_status_keeps_incomplete_reconcile_status(minimal_config, harness):
+    harness.update_config({**minimal_config, "juju_password": ""})
+    status = harness.model.unit.status
+    with patch("ops.model.Container.get_checks", autospec=True) as get_checks:
+        harness.charm.on.update_status.emit()
+    get_checks.assert_not_called()
+    assert harness.model.unit.status == status
+
+
+def test_update_status_keeps_invalid_config_status(minimal_config, harness):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push("/cluster-autoscaler", "#!/bin/sh")
+    harness.update_config(minimal_config)
+    harness.update_config({"juju_password": "rotated"})
+    assert harness.model.unit.status == ActiveStatus()
+
+    harness.update_config({"juju_scale": "- {min: 1, max: 0, application: kubernetes-worker}"})
+    status = harness.model.unit.status
+    assert isinstance(status, BlockedStatus)
+    # the invalid option never reached dirty, so nothing is pending
+    assert list(harness.charm._stored.pending) == []
+    with patch("ops.model.Container.get_checks", autospec=True) as get_checks:
+        harness.charm.on.update_status.emit()
+    get_checks.assert_not_called()
+    assert harness.model.unit.status == status
+
+    harness.update_config({"juju_scale": minimal_config["juju_scale"]})
+    assert harness.model.unit.status == ActiveStatus()
+    with patch("ops.model.Container.get_checks", autospec=True, return_value={}):
+        harness.charm.on.update_status.emit()
+    assert harness.model.unit.status == ActiveStatus()
 
 
 @patch("ops.model.Container.get_services", autospec=True)
@@ -144,3 +593,70 @@ def test_juju_autoscaler_stop(mock_getservices, mock_stop, harness):
     mock_getservices.return_value = {"juju-autoscaler: []"}
     harness.charm.on.stop.emit()
     mock_stop.assert_called_once_with(container, "juju-autoscaler")
+
+
+@pytest.mark.parametrize("planned, deleted", [(0, True), (2, False)])
+def test_stop_deletes_manifests_with_the_last_unit(lightkube_client, harness, planned, deleted):
+    harness.set_planned_units(planned)
+    harness.charm.on.stop.emit()
+    assert lightkube_client.delete.called is deleted
+    assert harness.model.unit.status == WaitingStatus("Shutting down")
+
+
+def test_only_the_leader_applies_manifests(lightkube_client, minimal_config, harness):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push("/cluster-autoscaler", "#!/bin/sh")
+    harness.set_leader(False)
+    harness.update_config(minimal_config)
+    assert harness.model.unit.status == ActiveStatus()
+    assert harness.get_container_pebble_plan("juju-autoscaler").services
+    lightkube_client.apply.assert_not_called()
+    lightkube_client.patch.assert_not_called()
+
+    harness.set_leader(True)
+    assert lightkube_client.apply.called
+    assert lightkube_client.patch.called
+    # whatever the previous leader applied is found by listing the inventory
+    assert lightkube_client.list.call_count == 9
+    assert not harness.charm._stored.audit
+    assert harness.charm._stored.pending == []
+
+
+@patch("process.start")
+def test_drift_watcher_follows_manifests(start, minimal_config, harness, tmp_path):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push("/cluster-autoscaler", "#!/bin/sh")
+    with patch("charm.WATCHER_STATE", tmp_path):
+        harness.update_config(minimal_config)
+        start.assert_not_called()
+
+        harness.update_config({"autoscaler_drift_repair": True})
+        start.assert_called_once()
+        script, args, pidfile, _ = start.call_args[0]
+        assert script.name == "watcher.py"
+        assert args == [tmp_path / "desired.json"] and args[0].exists()
+
+        with patch("process.running", return_value=None), patch(
+            "ops.model.Container.get_checks", autospec=True, return_value={}
+        ):
+            harness.charm.on.update_status.emit()
+        assert start.call_count == 2
+
+        with patch("process.stop") as stop:
+            harness.charm.on.stop.emit()
+        stop.assert_called_once_with(pidfile, script)
+
+
+@pytest.mark.parametrize("event", ["update_status", "leader_settings_changed"])
+def test_drift_watcher_stopped_when_leadership_lost(minimal_config, harness, tmp_path, event):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push("/cluster-autoscaler", "#!/bin/sh")
+    with patch("charm.WATCHER_STATE", tmp_path), patch("process.start"):
+        harness.update_config({**minimal_config, "autoscaler_drift_repair": True})
+
+    harness.set_leader(False)
+    get_checks = patch("ops.model.Container.get_checks", autospec=True, return_value={})
+    with patch("charm.WATCHER_STATE", tmp_path), patch("process.stop") as stop, get_checks:
+        getattr(harness.charm.on, event).emit()
+    stop.assert_called_once()
+    assert stop.call_args[0][0] == tmp_path / "watcher.pid"
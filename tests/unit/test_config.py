@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from ops.testing import Harness
+import yaml
+
+from charm import KubernetesAutoscalerCharm
+from config import AutoscalerConfig, JujuConfig
+from config.scale import ConfigScale
+
+SCALE = "- {min: 1, max: 3, application: kubernetes-worker}"
+
+
+@pytest.fixture
+def stored():
+    harness = Harness(KubernetesAutoscalerCharm)
+    harness.begin()
+    yield harness.charm._stored
+    harness.cleanup()
+
+
+def _charm(**config):
+    defaults = {
+        f"{prefix}{key}": default
+        for prefix, parser in (("juju_", JujuConfig), ("autoscaler_", AutoscalerConfig))
+        for key, (_, default) in parser._types.items()
+    }
+    return SimpleNamespace(config={**defaults, **config})
+
+
+def test_dirty_keys(stored):
+    juju_config = JujuConfig(stored)
+    juju_config.load(_charm(juju_scale=SCALE, juju_username="alice"))
+    assert juju_config.dirty == {"scale", "username"}
+
+    juju_config = JujuConfig(stored)
+    juju_config.load(_charm(juju_scale=SCALE, juju_username="bob"))
+    assert juju_config.dirty == {"username"}
+
+
+def test_parsed_config_persisted(stored):
+    JujuConfig(stored).load(_charm(juju_scale=SCALE))
+    AutoscalerConfig(stored).load(_charm(autoscaler_extra_args="{v: 5}"))
+
+    # A later hook rebuilds every option without parsing yaml
+    with patch("yaml.safe_load", side_effect=AssertionError("parsed yaml")):
+        juju_config, autoscaler_config = JujuConfig(stored), AutoscalerConfig(stored)
+        assert juju_config["scale"].nodes("model") == ["1:3:model:kubernetes-worker"]
+        assert autoscaler_config["extra_args"].key_values == [("v", 5)]
+
+
+def test_parsed_config_invalidated_by_parser_version(stored):
+    JujuConfig(stored).load(_charm(juju_scale=SCALE))
+    with patch.object(ConfigScale, "VERSION", ConfigScale.VERSION + 1), patch(
+        "yaml.load", wraps=yaml.load
+    ) as load:
+        assert JujuConfig(stored)["scale"].nodes("model") == ["1:3:model:kubernetes-worker"]
+    load.assert_called_once()
@@ -0,0 +1,42 @@
+import pytest
+
+from config.headroom import ConfigHeadroom
+from errors import ConfigError
+
+
+def test_default_headroom():
+    assert ConfigHeadroom("").groups == {}
+
+
+def test_headroom_groups():
+    headroom = ConfigHeadroom(
+        "kubernetes-worker: {replicas: 4, cpu: 500m, memory: 1Gi}\n"
+        "kubernetes-worker-gpu: {nodes: 1, cpu: 3}\n"
+    )
+    assert headroom.groups == {
+        "kubernetes-worker": {"replicas": 4, "cpu": "500m", "memory": "1Gi"},
+        "kubernetes-worker-gpu": {"nodes": 1, "cpu": "3"},
+    }
+    cached = ConfigHeadroom(headroom.cfg, cached=headroom.normalized())
+    assert cached.groups == headroom.groups
+
+
+@pytest.mark.parametrize(
+    "cfg, error",
+    [
+        ("[kubernetes-worker]", "yaml or json format - expected a mapping"),
+        ("{w: 1}", "expected a mapping for w"),
+        ("{w: {replicas: 1, gpu: 1}}", "unexpected keys gpu for w"),
+        ("{w: {cpu: 1}}", "w needs exactly one of replicas or nodes"),
+        ("{w: {replicas: 1, nodes: 1, cpu: 1}}", "w needs exactly one of replicas or nodes"),
+        ("{w: {replicas: 0, cpu: 1}}", "w replicas must be a positive integer"),
+        ("{w: {nodes: true, cpu: 1}}", "w nodes must be a positive integer"),
+        ("{w: {replicas: 1}}", "w needs cpu and/or memory"),
+        ("{w: {replicas: 1, memory: lots}}", "w memory invalid quantity lots"),
+        ("{w: {replicas: 1, cpu: 0}}", "w cpu 0 must be greater than zero"),
+    ],
+)
+def test_invalid_headroom(cfg, error):
+    with pytest.raises(ConfigError) as ie:
+        ConfigHeadroom(cfg)
+    assert str(ie.value) == f"autoscaler_headroom invalid: {error}"
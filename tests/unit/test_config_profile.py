@@ -0,0 +1,31 @@
+import pytest
+
+from config.profile import PROFILES, ConfigProfile
+from errors import ConfigError
+
+
+def test_default_profile():
+    assert ConfigProfile("").key_values == []
+
+
+@pytest.mark.parametrize("name", PROFILES)
+def test_profile_flags(name):
+    assert ConfigProfile(name).key_values == list(PROFILES[name].items())
+
+
+def test_unknown_profile():
+    with pytest.raises(ConfigError) as ie:
+        ConfigProfile("fast")
+    assert str(ie.value) == (
+        "autoscaler_profile invalid: 'fast' is not one of"
+        " low-latency, balanced, cost-saver, large-cluster"
+    )
+
+
+def test_overrides_replace_profile_flags():
+    profile = ConfigProfile("low-latency")
+    merged = profile.merged([("scan-interval", "1s"), ("v", 5)])
+    assert ("scan-interval", "5s") not in merged
+    assert [value for key, value in merged if key == "scan-interval"] == ["1s"]
+    assert ("v", 5) in merged
+    assert ("kube-client-qps", 20) in merged
@@ -0,0 +1,62 @@
+import pytest
+
+from autoscaler import _sizing
+from config.resources import ConfigResources, quantity
+from errors import ConfigError
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("500m", 0.5), ("2", 2), (2, 2), ("1.5", 1.5), ("1Gi", 2**30), ("1G", 1e9)],
+)
+def test_quantity(value, expected):
+    assert quantity(value) == expected
+
+
+def test_default_resources():
+    resources = ConfigResources("")
+    assert (resources.cpu, resources.memory) == (None, None)
+
+
+def test_resources_override():
+    resources = ConfigResources("{cpu: 1500m, memory: 2Gi}")
+    assert (resources.cpu, resources.memory) == (1.5, 2**31)
+    cached = ConfigResources("{cpu: 1500m, memory: 2Gi}", cached=resources.normalized())
+    assert (cached.cpu, cached.memory) == (1.5, 2**31)
+
+
+@pytest.mark.parametrize(
+    "cfg, error",
+    [
+        ("[cpu]", "yaml or json format - expected a mapping"),
+        ("{gpu: 1}", "unexpected keys gpu"),
+        ("{cpu: lots}", "invalid quantity lots"),
+        ("{memory: 0}", "quantities must be greater than zero"),
+        ("{memory: 500m}", "memory must be at least 1 byte"),
+    ],
+)
+def test_invalid_resources(cfg, error):
+    with pytest.raises(ConfigError) as ie:
+        ConfigResources(cfg)
+    assert str(ie.value) == f"autoscaler_resources invalid: {error}"
+
+
+@pytest.mark.parametrize(
+    "nodes, cpu, memory, limit, gomaxprocs, gomemlimit",
+    [
+        (3, "108m", "316Mi", "632Mi", "2", "568MiB"),
+        (16, "108m", "316Mi", "632Mi", "2", "568MiB"),
+        (1000, "612m", "1324Mi", "2648Mi", "2", "2383MiB"),
+        (100000, "4000m", "16384Mi", "32768Mi", "4", "29491MiB"),
+    ],
+)
+def test_sizing_grows_with_nodes(nodes, cpu, memory, limit, gomaxprocs, gomemlimit):
+    resources, environment = _sizing(nodes, ConfigResources(""))
+    assert resources == {"requests": {"cpu": cpu, "memory": memory}, "limits": {"memory": limit}}
+    assert environment == {"GOMAXPROCS": gomaxprocs, "GOMEMLIMIT": gomemlimit}
+
+
+def test_sizing_override():
+    resources, environment = _sizing(3, ConfigResources("{cpu: 3, memory: 1Gi}"))
+    assert resources["requests"] == {"cpu": "3000m", "memory": "1024Mi"}
+    assert environment == {"GOMAXPROCS": "3", "GOMEMLIMIT": "1843MiB"}
@@ -1,3 +1,5 @@
+from datetime import datetime, timezone
+
 import pytest
 
 from config.scale import ConfigScale
@@ -85,24 +87,75 @@ def test_error_min_not_an_int():
     with pytest.raises(ConfigError) as ie:
         ConfigScale(cfg)
     assert str(ie.value).startswith(
-        "juju_scale invalid: <min> & <max> must be non-negative, non-zero integers -"
+        "juju_scale invalid: <min> & <max> must be non-negative integers, <max> non-zero -"
     )
 
 
-def test_error_min_lte_0():
-    cfg = "- {min: 0, max: 3, application: kubernetes-worker}"
+def test_error_min_lt_0():
+    cfg = "- {min: -1, max: 3, application: kubernetes-worker}"
     with pytest.raises(ConfigError) as ie:
         ConfigScale(cfg)
     assert str(ie.value).startswith(
-        "juju_scale invalid: <min> & <max> must be non-negative, non-zero integers -"
+        "juju_scale invalid: <min> & <max> must be non-negative integers, <max> non-zero -"
     )
 
-    cfg = "- {min: -1, max: 3, application: kubernetes-worker}"
+
+def test_error_min_0_without_template():
+    cfg = "- {min: 0, max: 3, application: kubernetes-worker}"
     with pytest.raises(ConfigError) as ie:
         ConfigScale(cfg)
-    assert str(ie.value).startswith(
-        "juju_scale invalid: <min> & <max> must be non-negative, non-zero integers -"
+    assert str(ie.value).startswith("juju_scale invalid: <min> of 0 requires a node template -")
+
+
+def test_scale_from_zero_with_template():
+    scale = ConfigScale(
+        "- min: 0\n"
+        "  max: 2\n"
+        "  application: kubernetes-worker-gpu\n"
+        "  template:\n"
+        "    cpu: 8\n"
+        "    memory: 64Gi\n"
+        "    gpu: 1\n"
+        "    labels: {accelerator: nvidia}\n"
+        "    taints: [nvidia.com/gpu=present:NoSchedule, dedicated:NoExecute]\n"
+        "- {min: 1, max: 3, application: kubernetes-worker}\n"
     )
+    assert scale.nodes("test") == ["0:2:test:kubernetes-worker-gpu", "1:3:test:kubernetes-worker"]
+    template = {
+        "cpu": "8",
+        "memory": "64Gi",
+        "gpu": 1,
+        "labels": {"accelerator": "nvidia"},
+        "taints": [
+            {"key": "nvidia.com/gpu", "value": "present", "effect": "NoSchedule"},
+            {"key": "dedicated", "value": "", "effect": "NoExecute"},
+        ],
+    }
+    assert scale.templates("test") == {"test:kubernetes-worker-gpu": template}
+    assert ConfigScale(scale.cfg, cached=scale.normalized()).templates("test") == {
+        "test:kubernetes-worker-gpu": template
+    }
+
+
+@pytest.mark.parametrize(
+    "template, error",
+    [
+        ("[]", "template should be a mapping"),
+        ("{cpu: 1}", "template missing required element 'memory'"),
+        ("{cpu: 1, memory: 1Gi, disk: 1}", "unexpected template keys disk"),
+        ("{cpu: 0, memory: 1Gi}", "template cpu and memory must be greater than zero"),
+        ("{cpu: 1, memory: lots}", "template invalid quantity lots"),
+        ("{cpu: 1, memory: 1Gi, gpu: -1}", "template gpu should be a non-negative integer"),
+        ("{cpu: 1, memory: 1Gi, labels: [a]}", "template labels should be a mapping"),
+        ("{cpu: 1, memory: 1Gi, taints: a:NoSchedule}", "template taints should be a list"),
+        ("{cpu: 1, memory: 1Gi, taints: [a:Never]}", "taint should be <key>[=<value>]:<effect>"),
+    ],
+)
+def test_error_template(template, error):
+    cfg = f"- {{min: 0, max: 3, application: kubernetes-worker, template: {template}}}"
+    with pytest.raises(ConfigError) as ie:
+        ConfigScale(cfg)
+    assert str(ie.value).startswith(f"juju_scale invalid: {error} -")
 
 
 def test_error_model_invalid():
@@ -110,3 +163,127 @@ def test_error_model_invalid():
     with pytest.raises(ConfigError) as ie:
         ConfigScale(cfg)
     assert str(ie.value).startswith("juju_scale invalid: Invalid model uuid - ")
+
+
+def test_error_duplicate_node_group():
+    cfg = (
+        "- {min: 1, max: 3, application: kubernetes-worker}\n"
+        "- {min: 1, max: 3, application: kubernetes-worker}\n"
+    )
+    with pytest.raises(ConfigError) as ie:
+        ConfigScale(cfg)
+    assert str(ie.value) == "juju_scale invalid: duplicate node-group for :kubernetes-worker"
+
+
+def test_error_conflicting_bounds():
+    model = "cdcaed9f-336d-47d3-83ba-d9ea9047b18c"
+    cfg = (
+        f"- {{min: 1, max: 3, model: {model}, application: kubernetes-worker}}\n"
+        f"- {{min: 2, max: 5, model: {model}, application: kubernetes-worker}}\n"
+    )
+    with pytest.raises(ConfigError) as ie:
+        ConfigScale(cfg)
+    assert str(ie.value) == (
+        f"juju_scale invalid: conflicting bounds for {model}:kubernetes-worker - 1:3 and 2:5"
+    )
+
+
+def test_error_conflict_with_default_model():
+    model = "cdcaed9f-336d-47d3-83ba-d9ea9047b18c"
+    scale = ConfigScale(
+        "- {min: 1, max: 3, application: kubernetes-worker}\n"
+        f"- {{min: 2, max: 5, model: {model}, application: kubernetes-worker}}\n"
+    )
+    assert scale.nodes(None) == [f"2:5:{model}:kubernetes-worker"]
+    with pytest.raises(ConfigError) as ie:
+        scale.nodes(model)
+    assert str(ie.value).startswith("juju_scale invalid: conflicting bounds for ")
+
+
+def test_nodes_are_memoized():
+    scale = ConfigScale("- {min: 1, max: 3, application: kubernetes-worker}")
+    assert scale.nodes("test") is scale.nodes("test")
+    assert scale.nodes("other") == ["1:3:other:kubernetes-worker"]
+
+
+def test_normalized_round_trip():
+    model = "cdcaed9f-336d-47d3-83ba-d9ea9047b18c"
+    cfg = (
+        "- {min: 1, max: 3, application: kubernetes-worker}\n"
+        f"- {{min: 2, max: 5, model: {model}, application: kubernetes-worker-gpu}}\n"
+    )
+    scale = ConfigScale(cfg)
+    restored = ConfigScale(cfg, cached=scale.normalized())
+    assert restored.scale == scale.scale
+    assert restored.nodes("test") == scale.nodes("test")
+
+
+def test_priorities():
+    model = "cdcaed9f-336d-47d3-83ba-d9ea9047b18c"
+    scale = ConfigScale(
+        "- {min: 1, max: 3, application: kubernetes-worker, priority: 10}\n"
+        f"- {{min: 1, max: 3, application: kubernetes-worker, model: {model}, priority: 50}}\n"
+        "- {min: 1, max: 3, application: kubernetes-worker-slow, priority: 10}\n"
+        "- {min: 1, max: 3, application: kubernetes-worker-any}\n"
+    )
+    assert list(scale.priorities("test")) == [50, 10]
+    assert scale.priorities("test") == {
+        50: [f"^({model}[:/])?kubernetes-worker$"],
+        10: ["^(test[:/])?kubernetes-worker$", "^(test[:/])?kubernetes-worker-slow$"],
+    }
+    assert scale.priorities(None) == {50: [f"^({model}[:/])?kubernetes-worker$"]}
+
+
+def test_error_priority_not_an_int():
+    with pytest.raises(ConfigError) as ie:
+        ConfigScale("- {min: 1, max: 3, application: kubernetes-worker, priority: high}")
+    assert str(ie.value).startswith("juju_scale invalid: <priority> must be an integer -")
+
+
+SCHEDULED = (
+    "- min: 1\n"
+    "  max: 3\n"
+    "  application: kubernetes-worker\n"
+    "  schedule:\n"
+    "    - {cron: '0 8 * * mon-fri', duration: 10h, min: 5, max: 10}\n"
+    "    - {cron: '0 20 * * *', duration: 1h, min: 2, max: 4}\n"
+    "- {min: 1, max: 2, application: kubernetes-worker-gpu}\n"
+)
+
+
+@pytest.mark.parametrize(
+    "hour, active, nodes",
+    [
+        (7, [None, None], ["1:3:test:kubernetes-worker", "1:2:test:kubernetes-worker-gpu"]),
+        (9, [0, None], ["5:10:test:kubernetes-worker", "1:2:test:kubernetes-worker-gpu"]),
+        (20, [1, None], ["2:4:test:kubernetes-worker", "1:2:test:kubernetes-worker-gpu"]),
+    ],
+)
+def test_scheduled_bounds(hour, active, nodes):
+    at = datetime(2024, 1, 1, hour, tzinfo=timezone.utc)
+    scale = ConfigScale(SCHEDULED)
+    assert scale.scheduled
+    assert scale.active(at) == active
+    assert scale.nodes("test", at=at) == nodes
+    assert scale.windows == active
+    restored = ConfigScale(SCHEDULED, cached=scale.normalized())
+    assert restored.nodes("test", at=at) == nodes
+
+
+@pytest.mark.parametrize(
+    "schedule, error",
+    [
+        ("{}", "schedule should be a list"),
+        ("[a]", "schedule entries should be mappings"),
+        ("[{cron: '* * * * *', min: 1, max: 2}]", "schedule missing required element 'duration'"),
+        ("[{cron: '* * *', duration: 1h, min: 1, max: 2}]", "schedule '* * *' should have 5"),
+        ("[{cron: '* * * * *', duration: 1w, min: 1, max: 2}]", "schedule invalid duration '1w'"),
+        ("[{cron: '* * * * *', duration: 1h, min: 3, max: 2}]", "<min> should be less than <max>"),
+        ("[{cron: '* * * * *', duration: 1h, min: 0, max: 2}]", "<min> of 0 requires a node"),
+    ],
+)
+def test_error_schedule(schedule, error):
+    cfg = f"- {{min: 1, max: 3, application: kubernetes-worker, schedule: {schedule}}}"
+    with pytest.raises(ConfigError) as ie:
+        ConfigScale(cfg)
+    assert str(ie.value).startswith(f"juju_scale invalid: {error}")
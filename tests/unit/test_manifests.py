@@ -0,0 +1,151 @@
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from lightkube.core.exceptions import ApiError
+
+from errors import ManifestError
+from manifests import Manifests
+
+
+@pytest.fixture
+def manifests(make_charm):
+    return Manifests(make_charm())
+
+
+def test_apply_manifests_server_side_apply(lightkube_client, manifests):
+    manifests.apply_manifests()
+    lightkube_client.delete.assert_not_called()
+    lightkube_client.create.assert_not_called()
+
+    applied = {args[0].kind: args[0] for args, _ in lightkube_client.apply.call_args_list}
+    assert sorted(applied) == [
+        "ClusterRole",
+        "ClusterRoleBinding",
+        "PodDisruptionBudget",
+        "Role",
+        "RoleBinding",
+        "Service",
+    ]
+    assert all(kwargs == {"force": True} for _, kwargs in lightkube_client.apply.call_args_list)
+
+    binding = applied["ClusterRoleBinding"]
+    assert binding.subjects[0].name == "test-app"
+    assert binding.subjects[0].namespace == "test-model"
+
+
+def test_apply_manifests_roles_before_bindings(lightkube_client, manifests):
+    manifests.apply_manifests()
+    kinds = [args[0].kind for args, _ in lightkube_client.apply.call_args_list]
+    assert {"ClusterRoleBinding", "RoleBinding"} == set(kinds[-2:])
+
+
+def test_delete_manifest_bindings_before_roles(lightkube_client, manifests):
+    manifests.delete_manifest()
+    kinds = [args[0].__name__ for args, _ in lightkube_client.delete.call_args_list]
+    assert {"ClusterRoleBinding", "RoleBinding"} == set(kinds[:2])
+
+
+def test_apply_manifests_aggregates_errors(lightkube_client, manifests):
+    def apply(obj, **_):
+        if obj.kind in ("Role", "Service"):
+            raise ApiError(status={"message": "forbidden", "code": 403})
+
+    lightkube_client.apply.side_effect = apply
+    with pytest.raises(ManifestError) as ie:
+        manifests.apply_manifests()
+    assert lightkube_client.apply.call_count == 6
+    assert sorted(ie.value.errors) == [
+        "Role/kubernetes-autoscaler-juju-cluster-autoscaler",
+        "Service/kubernetes-autoscaler-juju-cluster-autoscaler",
+    ]
+    assert str(ie.value).startswith("Failed to apply Role/")
+
+
+def test_delete_manifest_ignores_not_found(lightkube_client, manifests):
+    status = {"message": "thing not found", "code": 404}
+    lightkube_client.delete.side_effect = ApiError(status=status)
+    manifests.delete_manifest(ignore_not_found=True)
+    assert lightkube_client.delete.call_count == 6
+    for args, kwargs in lightkube_client.delete.call_args_list:
+        assert args[1] == "kubernetes-autoscaler-juju-cluster-autoscaler"
+        assert kwargs == {"namespace": None}
+
+
+def test_resources_cached_by_digest(manifest_cache, manifests, make_charm):
+    resources = manifests.resources
+    assert [path.name for path in manifest_cache.iterdir()] == [f"{manifests.digest}.json"]
+
+    with patch("yaml.safe_load_all", side_effect=AssertionError("parsed yaml")):
+        assert Manifests(make_charm()).resources == resources
+
+
+def test_resources_keyed_by_application(manifest_cache, manifests, make_charm):
+    other = Manifests(make_charm("other-model", "other-app"))
+    assert other.digest != manifests.digest
+    assert other.resources[2].subjects[0].name == "other-app"
+    assert manifests.resources[2].subjects[0].name == "test-app"
+    assert [path.name for path in manifest_cache.iterdir()] == [f"{manifests.digest}.json"]
+
+
+def test_resources_keyed_by_version(manifest_cache, manifests, make_charm):
+    manifests.resources
+    digest = manifests.digest
+    with patch.object(Manifests, "VERSION", Manifests.VERSION + 1):
+        newer = Manifests(make_charm())
+        assert newer.digest != digest
+        with patch.object(Manifests, "_compile", wraps=newer._compile) as compile:
+            assert newer.resources == manifests.resources
+        compile.assert_called_once()
+        assert [path.name for path in manifest_cache.iterdir()] == [f"{newer.digest}.json"]
+
+
+def test_resources_grant_the_application_lease(manifest_cache, manifests, make_charm):
+    manifests.resources  # warm the cache, which holds the upstream rules
+    role = next(obj for obj in Manifests(make_charm()).resources if obj.kind == "ClusterRole")
+    leases = [rule for rule in role.rules if rule.resourceNames and "leases" in rule.resources]
+    assert leases[0].resourceNames == ["cluster-autoscaler", "test-app"]
+    assert leases[0].verbs == ["get", "update"]
+
+
+def test_resources_recompiled_on_corrupt_cache(manifest_cache, manifests):
+    manifest_cache.mkdir()
+    Path(manifest_cache, f"{manifests.digest}.json").write_text("{not json")
+    assert len(manifests.resources) == 6
+
+
+def _statefulset(resources):
+    from lightkube.models.apps_v1 import StatefulSetSpec
+    from lightkube.models.core_v1 import Container, PodSpec, PodTemplateSpec
+    from lightkube.models.core_v1 import ResourceRequirements
+    from lightkube.resources.apps_v1 import StatefulSet
+
+    container = Container(name="juju-autoscaler", resources=ResourceRequirements(**resources))
+    return StatefulSet(
+        spec=StatefulSetSpec(
+            selector=None,
+            serviceName="test-app",
+            template=PodTemplateSpec(spec=PodSpec(containers=[container])),
+        )
+    )
+
+
+RESOURCES = {"requests": {"cpu": "1000m", "memory": "1024Mi"}, "limits": {"memory": "2048Mi"}}
+
+
+def test_patch_pod_resources_when_changed(lightkube_client, manifests):
+    lightkube_client.get.return_value = _statefulset({"requests": {"cpu": "100m"}})
+    assert manifests.patch_pod_resources("juju-autoscaler", RESOURCES)
+    (_, name, patch), kwargs = lightkube_client.patch.call_args
+    assert name == "test-app" and kwargs == {"namespace": "test-model"}
+    assert patch["spec"]["template"]["spec"]["containers"] == [
+        {"name": "juju-autoscaler", "resources": RESOURCES}
+    ]
+
+
+def test_patch_pod_resources_skipped_when_equal(lightkube_client, manifests):
+    # the api server reports quantities in its own canonical units
+    current = {"requests": {"cpu": "1", "memory": "1Gi"}, "limits": {"memory": "2Gi"}}
+    lightkube_client.get.return_value = _statefulset(current)
+    assert not manifests.patch_pod_resources("juju-autoscaler", RESOURCES)
+    lightkube_client.patch.assert_not_called()
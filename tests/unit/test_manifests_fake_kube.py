@@ -0,0 +1,155 @@
+import time
+
+import pytest
+
+from errors import ManifestError
+from manifests import INVENTORY_LABEL, PRIORITY_EXPANDER, REVISION_LABEL, Manifests
+from throttle import TokenBucket
+
+NAME = "kubernetes-autoscaler-juju-cluster-autoscaler"
+
+
+def test_apply_creates_then_patches_in_place(fake_kube, manifests):
+    manifests.apply_manifests()
+    assert len(fake_kube.objects) == 6
+    uids = {key: obj["metadata"]["uid"] for key, obj in fake_kube.objects.items()}
+
+    manifests.apply_manifests()
+    assert {key: obj["metadata"]["uid"] for key, obj in fake_kube.objects.items()} == uids
+    assert sum(fake_kube.requests.values()) == 12
+    assert fake_kube.requests[("PATCH", "rolebindings")] == 2
+
+    key = ("rbac.authorization.k8s.io/v1", "rolebindings", "test-model", NAME)
+    binding = fake_kube.objects[key]
+    assert binding["subjects"][0]["name"] == "test-app"
+
+
+def test_delete_removes_everything(fake_kube, manifests):
+    manifests.apply_manifests()
+    manifests.delete_manifest()
+    assert fake_kube.objects == {}
+
+    manifests.delete_manifest(ignore_not_found=True)
+    with pytest.raises(ManifestError):
+        manifests.delete_manifest()
+
+
+def test_tiers_run_concurrently(fake_kube, manifests):
+    fake_kube.latency = 0.1
+    start = time.perf_counter()
+    manifests.apply_manifests()
+    # two tiers of requests rather than six sequential requests
+    assert time.perf_counter() - start < 0.45
+
+
+@pytest.mark.parametrize("code", [429, 500, 503])
+def test_retryable_faults_are_retried(fake_kube, manifests, code):
+    fake_kube.inject(code, count=2, method="PATCH", retry_after=0)
+    manifests.apply_manifests()
+    assert len(fake_kube.objects) == 6
+    assert sum(fake_kube.requests.values()) == 8
+
+
+def test_injected_fault_is_reported_per_object(fake_kube, manifests):
+    fake_kube.inject(403, method="PATCH")
+    with pytest.raises(ManifestError) as ie:
+        manifests.apply_manifests()
+    assert len(ie.value.errors) == 1
+    assert len(fake_kube.objects) == 5
+
+
+def test_rate_limited(fake_kube, manifests):
+    manifests.retry.limiter = TokenBucket(rate=20, burst=1)
+    start = time.perf_counter()
+    manifests.apply_manifests()
+    assert time.perf_counter() - start >= 5 / 20
+
+
+def test_headroom_applied_and_pruned(fake_kube, manifests, make_charm):
+    manifests.headroom = {
+        "kubernetes-worker": {"replicas": 2, "cpu": "500m"},
+        "kubernetes-worker-gpu": {"nodes": 1, "memory": "8Gi"},
+    }
+    manifests.apply_manifests()
+    previous = manifests.applied
+    assert len(fake_kube.objects) == 9
+    key = ("scheduling.k8s.io/v1", "priorityclasses", None, "test-model-test-app-headroom")
+    assert fake_kube.objects[key]["value"] < 0
+    key = ("apps/v1", "deployments", "test-model", "test-app-headroom-kubernetes-worker-gpu")
+    pod = fake_kube.objects[key]["spec"]["template"]["spec"]
+    assert pod["priorityClassName"] == "test-model-test-app-headroom"
+    assert pod["nodeSelector"] == {"juju-application": "kubernetes-worker-gpu"}
+    assert pod["affinity"]["podAntiAffinity"]
+
+    manifests = Manifests(make_charm(), client=manifests.client)
+    manifests.apply_manifests()
+    manifests.prune(previous)
+    assert len(fake_kube.objects) == 6
+    assert not any(plural == "deployments" for _, plural, _, _ in fake_kube.objects)
+
+
+def test_objects_labelled_with_inventory(fake_kube, manifests):
+    manifests.apply_manifests()
+    for obj in fake_kube.objects.values():
+        labels = obj["metadata"]["labels"]
+        assert labels[INVENTORY_LABEL] == "test-model.test-app"
+        assert labels[REVISION_LABEL] == manifests.revision
+
+
+def test_prune_unchanged_lists_nothing(fake_kube, manifests):
+    manifests.apply_manifests()
+    fake_kube.requests.clear()
+    manifests.prune(manifests.applied)
+    manifests.prune([])
+    assert not fake_kube.requests
+
+
+def test_audit_prunes_without_history(fake_kube, manifests, make_charm):
+    manifests.headroom = {"kubernetes-worker": {"replicas": 1, "cpu": "1"}}
+    manifests.apply_manifests()
+
+    manifests = Manifests(make_charm(), client=manifests.client)
+    manifests.apply_manifests()
+    fake_kube.requests.clear()
+    manifests.prune([], audit=True)
+    assert sum(n for (method, _), n in fake_kube.requests.items() if method == "GET") == 9
+    assert len(fake_kube.objects) == 6
+    assert not any(plural == "deployments" for _, plural, _, _ in fake_kube.objects)
+
+
+def test_prune_lists_each_kind_once(fake_kube, manifests, make_charm):
+    manifests.priorities = {10: ["^kubernetes-worker$"]}
+    manifests.apply_manifests()
+    previous = manifests.applied + [["v1", "Secret", "applied-before-labels"]]
+    other = Manifests(make_charm("other-model", "other-app"), client=manifests.client)
+    other.priorities = manifests.priorities
+    other.apply_manifests()
+    fake_kube.requests.clear()
+
+    manifests = Manifests(make_charm(), client=manifests.client)
+    manifests.prune(previous)
+    assert fake_kube.requests[("GET", "configmaps")] == 1
+    assert sum(n for (method, _), n in fake_kube.requests.items() if method == "GET") == 8
+    deleted = {plural for (method, plural), n in fake_kube.requests.items() if method == "DELETE"}
+    assert deleted == {"configmaps", "secrets"}
+    assert ("v1", "configmaps", "test-model", PRIORITY_EXPANDER) not in fake_kube.objects
+    assert ("v1", "configmaps", "other-model", PRIORITY_EXPANDER) in fake_kube.objects
+
+
+def test_delete_removes_leftovers(fake_kube, manifests, make_charm):
+    manifests.headroom = {"kubernetes-worker": {"replicas": 1, "cpu": "1"}}
+    manifests.apply_manifests()
+    previous = manifests.applied
+
+    manifests = Manifests(make_charm(), client=manifests.client)
+    manifests.delete_manifest(ignore_not_found=True, previous=previous)
+    assert fake_kube.objects == {}
+
+
+def test_delete_audit_removes_leftovers_without_history(fake_kube, manifests, make_charm):
+    manifests.priorities = {10: ["^kubernetes-worker$"]}
+    manifests.apply_manifests()
+
+    manifests = Manifests(make_charm(), client=manifests.client)
+    manifests.delete_manifest(ignore_not_found=True, audit=True)
+    assert fake_kube.objects == {}
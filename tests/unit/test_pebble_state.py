@@ -0,0 +1,120 @@
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from ops import pebble
+from ops.testing import Harness
+import yaml
+
+from charm import KubernetesAutoscalerCharm
+from pebble_state import PebbleState
+
+LAYER = {
+    "services": {
+        "juju-autoscaler": {
+            "override": "replace",
+            "command": "/cluster-autoscaler --v=5",
+            "startup": "enabled",
+        }
+    }
+}
+BINARY = Path("/cluster-autoscaler")
+
+
+@pytest.fixture
+def harness():
+    harness = Harness(KubernetesAutoscalerCharm)
+    harness.set_leader(True)
+    harness.begin()
+    yield harness
+    harness.cleanup()
+
+
+@pytest.fixture
+def container(harness):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push(str(BINARY), "#!/bin/sh")
+    return container
+
+
+def _reconcile(harness, container, layer=LAYER, content="endpoints: []"):
+    state = PebbleState(container, harness.charm._stored)
+    assert state.connect()
+    assert state.has_executable(BINARY)
+    replanned = state.ensure_layer(state.name, layer)
+    pushed = state.ensure_file("/config/cloud-config.yaml", content, make_dirs=True)
+    state.ensure_running(state.name, restart=replanned or pushed)
+    return state
+
+
+def test_first_reconcile_issues_every_mutation(harness, container):
+    state = _reconcile(harness, container)
+    # get_plan, list_files, add_layer, push, restart
+    assert state.calls == 5
+    assert container.get_service("juju-autoscaler").is_running()
+    assert container.pull("/config/cloud-config.yaml").read() == "endpoints: []"
+
+
+def test_unchanged_reconcile_only_reads_state(harness, container):
+    _reconcile(harness, container)
+    state = _reconcile(harness, container)
+    # get_plan, get_services
+    assert state.calls == 2
+
+
+def test_stopped_service_is_started(harness, container):
+    _reconcile(harness, container)
+    container.stop("juju-autoscaler")
+    state = _reconcile(harness, container)
+    # get_plan, get_services, start
+    assert state.calls == 3
+    assert container.get_service("juju-autoscaler").is_running()
+
+
+def test_changed_file_pushes_without_replan(harness, container):
+    _reconcile(harness, container)
+    state = _reconcile(harness, container, content="endpoints: [1.2.3.4:17070]")
+    # get_plan, push, restart
+    assert state.calls == 3
+
+
+def test_changed_layer_replans_without_push(harness, container):
+    _reconcile(harness, container)
+    layer = {"services": {"juju-autoscaler": {**LAYER["services"]["juju-autoscaler"]}}}
+    layer["services"]["juju-autoscaler"]["command"] = "/cluster-autoscaler --v=3"
+    state = _reconcile(harness, container, layer=layer)
+    # get_plan, add_layer, restart
+    assert state.calls == 3
+
+
+def test_missing_executable_is_not_cached(harness):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    state = PebbleState(container, harness.charm._stored)
+    assert state.connect()
+    assert not state.has_executable(BINARY)
+    assert not state.has_executable(BINARY)
+    assert state.calls == 3
+
+
+def test_executable_matched_by_exact_name(harness):
+    container = harness.model.unit.get_container("juju-autoscaler")
+    container.push(f"{BINARY}-v1", "#!/bin/sh")
+    state = PebbleState(container, harness.charm._stored)
+    assert state.connect()
+    assert not state.has_executable(BINARY)
+
+
+def test_changed_check_replans(harness, container):
+    check = {"override": "replace", "level": "alive", "http": {"url": "http://localhost:8085/"}}
+    layer = {**LAYER, "checks": {"health": check}}
+    _reconcile(harness, container, layer=layer)
+    # the testing backend's plan has no checks, serve one as pebble would
+    plan = pebble.Plan(
+        yaml.safe_dump({**container.get_plan().to_dict(), "checks": layer["checks"]})
+    )
+    with patch.object(type(container), "get_plan", return_value=plan):
+        state = PebbleState(container, harness.charm._stored)
+        assert state.connect()
+        assert not state.ensure_layer(state.name, layer)
+        changed = {**check, "threshold": 5}
+        assert state.ensure_layer(state.name, {**LAYER, "checks": {"health": changed}})
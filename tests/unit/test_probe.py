@@ -0,0 +1,61 @@
+import socket
+import time
+from unittest.mock import patch
+
+import pytest
+
+import probe
+
+
+@pytest.fixture(autouse=True)
+def endpoint_probe():
+    # Probe real sockets, overriding conftest's
+    yield
+
+
+@pytest.fixture
+def listener():
+    with socket.socket() as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        yield "127.0.0.1:{}".format(server.getsockname()[1])
+
+
+@pytest.fixture
+def closed():
+    with socket.socket() as server:
+        server.bind(("127.0.0.1", 0))
+        port = server.getsockname()[1]
+    return f"127.0.0.1:{port}"
+
+
+def test_reachable_endpoints_rank_first(listener, closed):
+    assert probe.rank([closed, listener]) == ([listener, closed], 1)
+
+
+def test_unreachable_endpoints_keep_their_order(closed):
+    assert probe.rank([closed, "invalid", "[::1]:bad"]) == ([closed, "invalid", "[::1]:bad"], 0)
+
+
+def test_rank_by_latency(listener):
+    slow, fast = "10.0.0.1:17070", "10.0.0.2:17070"
+    latencies = {slow: 0.2, fast: 0.05, listener: 0.052}
+    with patch.object(probe, "latency", side_effect=lambda endpoint, _: latencies[endpoint]):
+        # jitter within a bucket keeps the configured order
+        assert probe.rank([slow, listener, fast]) == ([listener, fast, slow], 3)
+
+
+def test_probes_run_concurrently():
+    endpoints = [f"10.0.0.{i}:17070" for i in range(10)]
+
+    def timed_out(endpoint, timeout):
+        time.sleep(0.1)
+
+    with patch.object(probe, "latency", side_effect=timed_out):
+        start = time.perf_counter()
+        assert probe.rank(endpoints) == (endpoints, 0)
+        assert time.perf_counter() - start < 0.5
+
+
+def test_reorder_follows_previous_rank():
+    assert probe.reorder(["a:1", "b:1", "c:1"], ["c:1", "a:1"]) == ["c:1", "a:1", "b:1"]
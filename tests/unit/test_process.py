@@ -0,0 +1,59 @@
+import os
+from pathlib import Path
+import time
+
+import pytest
+
+import process
+
+
+def _started(pidfile, script):
+    # the new process' cmdline is briefly empty once it has exec'd
+    for _ in range(100):
+        if process.running(pidfile, script):
+            return process.running(pidfile, script)
+        time.sleep(0.01)
+
+
+def _exited(pid):
+    # subprocess reaps the killed process whenever it next starts one, until then
+    # it lingers as a zombie without a cmdline
+    for _ in range(100):
+        try:
+            if not Path("/proc", str(pid), "cmdline").read_bytes():
+                return True
+        except OSError:
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def script(tmp_path):
+    script = tmp_path / "sleeper.py"
+    script.write_text("import time\ntime.sleep(30)\n")
+    return script
+
+
+def test_start_then_stop(tmp_path, script):
+    pidfile = tmp_path / "state" / "sleeper.pid"
+    pid = process.start(script, [], pidfile, tmp_path / "sleeper.log")
+    assert _started(pidfile, script) == pid
+    assert os.getsid(pid) == pid
+
+    replacement = process.start(script, [], pidfile, tmp_path / "sleeper.log")
+    assert _exited(pid)
+    assert _started(pidfile, script) == replacement != pid
+    process.stop(pidfile, script)
+    assert _exited(replacement)
+    assert process.running(pidfile, script) is None
+    assert not pidfile.exists()
+
+
+def test_running_ignores_other_processes(tmp_path, script):
+    pidfile = tmp_path / "sleeper.pid"
+    assert process.running(pidfile, script) is None
+    pidfile.write_text(str(os.getpid()))
+    assert process.running(pidfile, script) is None
+    process.stop(pidfile, script)
+    assert not pidfile.exists()
@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from config.schedule import Cron, duration
+
+# a monday
+MONDAY = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize(
+    "text, seconds",
+    [("90m", 5400), ("10h", 36000), ("1d12h", 129600), ("1d2h3m", 93780)],
+)
+def test_duration(text, seconds):
+    assert duration(text) == seconds
+
+
+@pytest.mark.parametrize("text", ["", "10", "1w", "h"])
+def test_invalid_duration(text):
+    with pytest.raises(ValueError):
+        duration(text)
+
+
+@pytest.mark.parametrize(
+    "expression",
+    ["* * * *", "60 * * * *", "* 24 * * *", "* * 0 * *", "* * * 13 *", "*/0 * * * *", "a * * * *"],
+)
+def test_invalid_cron(expression):
+    with pytest.raises(ValueError):
+        Cron(expression)
+
+
+def test_cron_fields():
+    cron = Cron("*/15 8-10 1,15 jan-mar mon,wed,7")
+    assert cron.minutes == {0, 15, 30, 45}
+    assert cron.hours == {8, 9, 10}
+    assert cron.days == {1, 15}
+    assert cron.months == {1, 2, 3}
+    assert cron.weekdays == {0, 1, 3}
+
+
+@pytest.mark.parametrize(
+    "at, active",
+    [
+        (MONDAY.replace(hour=7, minute=59), False),
+        (MONDAY.replace(hour=8), True),
+        (MONDAY.replace(hour=17, minute=59), True),
+        (MONDAY.replace(hour=18), False),
+        # saturday
+        (MONDAY.replace(day=6, hour=12), False),
+    ],
+)
+def test_business_hours(at, active):
+    assert Cron("0 8 * * mon-fri").active(at, duration("10h")) is active
+
+
+def test_window_spans_midnight():
+    cron = Cron("0 22 * * *")
+    assert cron.active(MONDAY.replace(hour=1), duration("4h"))
+    assert not cron.active(MONDAY.replace(hour=2), duration("4h"))
+    assert cron.latest(MONDAY.replace(hour=1), duration("4h")) == datetime(
+        2023, 12, 31, 22, tzinfo=timezone.utc
+    )
+
+
+def test_either_day_field_matches():
+    # the 1st of the month, or any friday
+    cron = Cron("0 0 1 * fri")
+    assert cron.active(MONDAY, 60)
+    assert cron.active(MONDAY.replace(day=5), 60)
+    assert not cron.active(MONDAY.replace(day=4), 60)
@@ -0,0 +1,79 @@
+from unittest.mock import MagicMock
+
+import httpx
+import pytest
+from lightkube.core.exceptions import ApiError
+
+from throttle import Retry, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def _api_error(code, retry_after=None):
+    headers = {"Retry-After": retry_after} if retry_after else {}
+    response = httpx.Response(code, json={"code": code, "message": "failed"}, headers=headers)
+    return ApiError(response=response)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_token_bucket_allows_burst_then_limits_rate(clock):
+    bucket = TokenBucket(rate=2.0, burst=3, clock=clock, sleep=clock.sleep)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.slept == []
+    bucket.acquire()
+    assert clock.slept == [0.5]
+
+
+def test_retry_succeeds_after_retryable_errors(clock):
+    func = MagicMock(side_effect=[_api_error(429), _api_error(503), "done"])
+    retry = Retry(TokenBucket(clock=clock, sleep=clock.sleep), base=1.0, sleep=clock.sleep)
+    assert retry(func, "arg", key="value") == "done"
+    assert func.call_count == 3
+    assert len(clock.slept) == 2
+    assert 0 <= clock.slept[0] <= 1.0 and 0 <= clock.slept[1] <= 2.0
+
+
+def test_retry_honours_retry_after(clock):
+    func = MagicMock(side_effect=[_api_error(429, retry_after="3"), "done"])
+    retry = Retry(TokenBucket(clock=clock, sleep=clock.sleep), sleep=clock.sleep)
+    assert retry(func) == "done"
+    assert clock.slept == [3.0]
+
+
+def test_retry_transport_errors(clock):
+    func = MagicMock(side_effect=[httpx.ReadTimeout("slow"), "done"])
+    retry = Retry(TokenBucket(clock=clock, sleep=clock.sleep), sleep=clock.sleep)
+    assert retry(func) == "done"
+
+
+@pytest.mark.parametrize("code", [403, 404, 409])
+def test_retry_raises_non_retryable(clock, code):
+    func = MagicMock(side_effect=_api_error(code))
+    retry = Retry(TokenBucket(clock=clock, sleep=clock.sleep), sleep=clock.sleep)
+    with pytest.raises(ApiError):
+        retry(func)
+    assert func.call_count == 1
+
+
+def test_retry_gives_up_after_attempts(clock):
+    func = MagicMock(side_effect=_api_error(500))
+    retry = Retry(TokenBucket(clock=clock, sleep=clock.sleep), attempts=3, sleep=clock.sleep)
+    with pytest.raises(ApiError):
+        retry(func)
+    assert func.call_count == 3
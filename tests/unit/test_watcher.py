@@ -0,0 +1,119 @@
+import copy
+from unittest.mock import MagicMock, patch
+
+from lightkube.core.exceptions import ApiError
+from lightkube.resources.apps_v1 import Deployment
+from lightkube.resources.rbac_authorization_v1 import ClusterRole, Role
+import pytest
+
+from throttle import Retry, TokenBucket
+from watcher import Desired, Watcher, _covers
+
+NAME = "kubernetes-autoscaler-juju-cluster-autoscaler"
+CLUSTER_ROLE = ("rbac.authorization.k8s.io/v1", "ClusterRole")
+ROLE = ("rbac.authorization.k8s.io/v1", "Role")
+
+
+@pytest.fixture
+def desired(tmp_path, manifests):
+    manifests.store_desired(tmp_path / "desired.json")
+    return Desired(tmp_path / "desired.json")
+
+
+@pytest.fixture
+def watcher(desired, manifests):
+    return Watcher(desired, manifests.client, retry=manifests.retry)
+
+
+def test_covers_ignores_fields_the_server_adds():
+    desired = {"metadata": {"name": "a"}, "rules": [{"verbs": ["get"]}]}
+    live = {"metadata": {"name": "a", "uid": "1"}, "rules": [{"verbs": ["get"], "x": 1}]}
+    assert _covers(live, desired)
+    assert not _covers({**live, "rules": []}, desired)
+    assert not _covers({**live, "rules": [{"verbs": ["list"]}]}, desired)
+    assert not _covers({"metadata": {"name": "a"}}, desired)
+
+
+def test_covers_compares_quantities_by_value():
+    desired = {"resources": {"requests": {"cpu": "0.5", "memory": "1024Mi"}}}
+    live = {"resources": {"requests": {"cpu": "500m", "memory": "1Gi"}}}
+    assert _covers(live, desired)
+    assert not _covers({"resources": {"requests": {"cpu": "1", "memory": "1Gi"}}}, desired)
+    assert not _covers({"name": "500m"}, {"name": "0.5"})
+
+
+def test_repair_ignores_canonicalized_quantities(tmp_path, manifests):
+    manifests.headroom = {"kubernetes-worker": {"replicas": 1, "cpu": "0.5", "memory": "1024Mi"}}
+    manifests.store_desired(tmp_path / "desired.json")
+    desired = Desired(tmp_path / "desired.json")
+    kind = ("apps/v1", "Deployment")
+    key = next(key for key in desired.load() if key[:2] == kind)
+    live = copy.deepcopy(desired.documents[key])
+    for container in live["spec"]["template"]["spec"]["containers"]:
+        container["resources"] = {
+            field: {"cpu": "500m", "memory": "1Gi"} for field in container["resources"]
+        }
+    client = MagicMock()
+    watcher = Watcher(desired, client, retry=Retry(TokenBucket()))
+    assert not watcher.repair(kind, "MODIFIED", Deployment.from_dict(live))
+    client.apply.assert_not_called()
+
+
+def test_desired_reloaded_when_written(tmp_path, desired, manifests):
+    assert (*CLUSTER_ROLE, NAME) in desired.load()
+    assert desired.namespace == "test-model"
+    assert desired.inventory == "test-model.test-app"
+
+    manifests.headroom = {"kubernetes-worker": {"replicas": 1, "cpu": "1"}}
+    manifests._resources = None
+    manifests.store_desired(tmp_path / "desired.json")
+    assert ("apps/v1", "Deployment") in desired.kinds
+
+
+def test_repair_only_drifted(desired):
+    client = MagicMock()
+    watcher = Watcher(desired, client, retry=Retry(TokenBucket()))
+    doc = desired.load()[(*ROLE, NAME)]
+    assert not watcher.repair(ROLE, "MODIFIED", Role.from_dict(doc))
+    assert not watcher.repair(ROLE, "ADDED", Role.from_dict({**doc, "metadata": {"name": "x"}}))
+    client.apply.assert_not_called()
+
+    assert watcher.repair(ROLE, "MODIFIED", Role.from_dict({**doc, "rules": []}))
+    assert watcher.repair(ROLE, "DELETED", Role.from_dict(doc))
+    assert client.apply.call_count == 2
+    assert client.apply.call_args[0][0].rules == Role.from_dict(doc).rules
+
+
+def test_resync_restores_deleted_and_edited(fake_kube, manifests, watcher):
+    manifests.apply_manifests()
+    key = ("rbac.authorization.k8s.io/v1", "clusterroles", None, NAME)
+    expected = fake_kube.objects.pop(key)["rules"]
+    key = ("rbac.authorization.k8s.io/v1", "roles", "test-model", NAME)
+    fake_kube.objects[key]["rules"] = []
+
+    watcher.resync(CLUSTER_ROLE, ClusterRole, None)
+    watcher.resync(ROLE, Role, "test-model")
+    key = ("rbac.authorization.k8s.io/v1", "clusterroles", None, NAME)
+    assert fake_kube.objects[key]["rules"] == expected
+    key = ("rbac.authorization.k8s.io/v1", "roles", "test-model", NAME)
+    assert fake_kube.objects[key]["rules"]
+
+    fake_kube.requests.clear()
+    watcher.resync(ROLE, Role, "test-model")
+    assert list(fake_kube.requests) == [("GET", "roles")]
+
+
+def test_watch_resumes_from_list_and_relists_when_expired(desired):
+    client = MagicMock()
+    client.list.return_value.resourceVersion = "42"
+    expired = ApiError(status={"message": "too old resource version", "code": 410})
+    client.watch.side_effect = [expired, SystemExit]
+    watcher = Watcher(desired, client, retry=Retry(TokenBucket()))
+    with patch("time.sleep") as sleep, pytest.raises(SystemExit):
+        watcher.watch(ROLE)
+    sleep.assert_not_called()
+    assert client.list.call_count == 2
+    labels = {"kubernetes-autoscaler.juju.is/inventory": "test-model.test-app"}
+    client.watch.assert_called_with(
+        Role, namespace="test-model", labels=labels, resource_version="42"
+    )